@@ -20,35 +20,48 @@
 '''
 PSPMAN: **PS**\ eudo **P**\ ackage **Man**\ ager
 
+Globally defined environment configuration is created on first access,
+so that importing pspman (e.g. for shell completion) stays cheap:
+
+    * print: Customized psprint function
+    * CONFIG: Meta data information about C_DIR(s), configuration directory, etc
+    * ENV: Standard installation context
+
 '''
 
 
-# Globally defined environment configuration
+import typing
 from pathlib import Path
-from psprint import init_print
-from .classes import InstallEnv
-from .config import read_config
 
 
-print = init_print(Path(__file__).resolve()
-                   .parent.joinpath(".psprintrc.yml")).psprint
-'''
-Customized psprint function
+__version__ = '1!1.4.0'
 
-'''
 
+def __getattr__(name: str) -> typing.Any:
+    '''
+    Create ``print``, ``CONFIG``, ``ENV`` on first access
 
-# ConfigBase
-CONFIG = read_config()
-'''
-Meta data information about C_DIR(s), configuration directory, etc
-'''
+    Args:
+        name: name of attribute
 
-# set configurations
-ENV = InstallEnv(CONFIG)
-'''
-Standard installation context
-'''
+    Returns:
+        attribute, retained for later accesses
 
-
-__version__ = '1!1.4.0'
+    Raises:
+        AttributeError: unknown attribute
+    '''
+    if name == 'print':
+        from psprint import init_print
+        value: typing.Any = init_print(
+            Path(__file__).resolve().parent.joinpath(".psprintrc.yml")
+        ).psprint
+    elif name == 'CONFIG':
+        from .config import read_config
+        value = read_config()
+    elif name == 'ENV':
+        from .classes import InstallEnv
+        value = InstallEnv(__getattr__('CONFIG'))
+    else:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    globals()[name] = value
+    return value
@@ -24,16 +24,10 @@ python module call
 
 import os
 import typing
-from .shell import git_clean
-from .psp_in import init, de_init, init_banner
-from .config import GroupDB
-from . import ENV, CONFIG, print, __version__
-from .define import cli_opts, prepare_env, lock
-from .installations import INST_METHODS
-from .switch_env import chenv
-from .serial_actions import (interrupt, find_gits, end_queues, init_queues,
-                             del_projects, add_projects, print_projects,
-                             update_projects, print_prefixes)
+import shutil
+import tempfile
+from . import __version__
+from .define import cli_opts
 
 
 def call() -> int:
@@ -49,14 +43,36 @@ def call() -> int:
         Error code to system
 
     '''
-    cli_kwargs = cli_opts(CONFIG)
+    # Subsystems are imported only when the call needs them:
+    # completion (which exits in ``cli_opts``) and version remain cheap.
+    cli_kwargs = cli_opts()
     call_function = cli_kwargs.get('call_function')
 
+    if call_function == 'version':
+        from . import print
+        print(__version__, mark='info', pref='VERSION')
+        return 0
+
+    if call_function == 'daemon':
+        from .daemon import serve, stop
+        return stop() if cli_kwargs.get('stop') else serve()
+
+    if call_function not in ('init', 'goodbye'):
+        from .daemon import hand_over
+        handed = hand_over()
+        if handed is not None:
+            return handed
+
+    from . import CONFIG, print
     if call_function == 'goodbye':
+        from .psp_in import de_init
         de_init(CONFIG)
         return 0
 
     if call_function == 'init':
+        from .config import GroupDB
+        from .psp_in import init, init_banner
+        from .installations import INST_METHODS
         opt_in = [i_t
                   for d_i in INST_METHODS.values()
                   for i_t in d_i.instruct.requires
@@ -73,48 +89,141 @@ def call() -> int:
         init_banner()
         return 0
 
-    if call_function == 'version':
-        print(__version__, mark='info', pref='VERSION')
-        return 0
-
     if 'default' not in CONFIG.meta_db_dirs:
         # not initiated
         return 1
 
+    from . import ENV
+    from .shell import set_git_backend
     env = ENV.update(cli_kwargs)
+    set_git_backend(env.git_backend)
+    group = CONFIG.find(env.prefix)
+    if 'compiler_cache' not in cli_kwargs:
+        env.compiler_cache = group.compiler_cache if group else None
+    elif env.compiler_cache == 'none':
+        env.compiler_cache = None
 
     if call_function == 'meta':
+        from .serial_actions import print_prefixes
         return print_prefixes(env=env)
 
-    env_err = prepare_env(env)
-    if env_err != 0:
-        return env_err
+    if call_function == 'log':
+        from .logs import print_log
+        return print_log(env.clone_dir, cli_kwargs['log_project'],
+                         step=cli_kwargs.get('step'))
+
+    envs = [env]
+    if cli_kwargs.get('all_groups') or cli_kwargs.get('groups'):
+        if call_function is not None or env.install or env.delete\
+           or env.reset:
+            print('Several groups can only be updated together', mark='err')
+            return 1
+        from .serial_actions import group_envs
+        envs = group_envs(env, names=cli_kwargs.get('groups'),
+                          group_cache='compiler_cache' not in cli_kwargs)
+        if not envs:
+            return 1
+
+    from .define import prepare_env, lock, lock_project
+    for grp_env in envs:
+        env_err = prepare_env(grp_env)
+        if env_err != 0:
+            return env_err
 
     if call_function == 'switch':
+        from .switch_env import chenv
+        # shared with runs: reports a group that is being recovered
+        lock(env=env)
         err_code = chenv(prefix_str=cli_kwargs['switch_to'],
                          copy=cli_kwargs.get('clipboard', False))
-        lock(env=env, message='environment switch.')
+        lock(env=env, unlock=True)
         return err_code
 
-    lock_state = lock(env=env, unlock=(call_function == 'unlock'))
-    if lock_state != 0:
-        return lock_state - 1
+    from .daemon import SERVING
+    # calls handed over to the daemon wait for each other's changes
+    queue = SERVING and call_function is None
+    if len(envs) == 1:
+        lock_state = lock(env=env, unlock=(call_function == 'unlock'),
+                          queue=queue)
+        if lock_state != 0:
+            return lock_state - 1
+    else:
+        # a group that is being recovered is skipped, others are updated;
+        # queued in a fixed order of groups
+        locked = [grp_env.prefix for grp_env in sorted(
+            envs, key=lambda grp_env: str(grp_env.prefix)
+        ) if lock(env=grp_env, queue=queue) == 0]
+        envs = [grp_env for grp_env in envs if grp_env.prefix in locked]
+        if not envs:
+            return 1
 
     if env.verbose:
-        print(env, mark='bug')
+        for grp_env in envs:
+            print(grp_env, mark='bug')
 
-    git_projects, failed_projects = find_gits(env=env)
+    from .serial_actions import find_gits, print_projects
+    if len(envs) == 1:
+        git_projects, failed_projects = find_gits(env=env)
+    else:
+        git_projects = {}
+        for grp_env in envs:
+            for project in find_gits(env=grp_env)[0].values():
+                project.group = str(grp_env.prefix)
+                git_projects[project.key] = project
     if env.call_function == 'info':
         lock(env=env, unlock=True)
         return print_projects(env=env, git_projects=git_projects,
                               failed_projects=failed_projects)
 
+    from .shell import git_clean
+    from .remote import SSHMux
+    from .installations import INST_METHODS
+    from .compiler_cache import available, snapshot_stats, report_stats
+    from .sharing import report
+    from .serial_actions import (interrupt, end_queues, init_queues,
+                                 del_projects, add_projects, update_projects,
+                                 parse_inst)
+
     # resets:
     for clean_code in env.reset:
-        if clean_code in git_projects:
+        if clean_code in git_projects and lock_project(env, clean_code):
             git_clean(env.clone_dir.joinpath(git_projects[clean_code].name))
+            shutil.rmtree(env.prefix.joinpath('incr_build',
+                                              git_projects[clean_code].name),
+                          ignore_errors=True)
 
-    queues = init_queues(env=env)
+    ssh_mux = None
+    if env.ssh_mux:
+        ssh_mux = SSHMux([project.url for project in git_projects.values()]
+                         + [parse_inst(inst)[0] for inst in env.install])
+        masters = ssh_mux.start()
+        if env.verbose:
+            print(f'{masters} ssh master connection(s) started', mark='bug')
+
+    # remembered by each group
+    compiler_caches = [grp_env.compiler_cache for grp_env in envs]
+    launchers = sorted({grp_env.compiler_cache for grp_env in envs
+                        if grp_env.compiler_cache is not None})
+    for launcher in launchers:
+        if not available(launcher):
+            print(f'{launcher} not found, building without it', mark='warn')
+    snapshots = {launcher: snapshot_stats(launcher) for launcher in launchers
+                 if available(launcher)}
+    for grp_env in envs:
+        if not available(grp_env.compiler_cache):
+            grp_env.compiler_cache = None
+
+    if len(envs) > 1:
+        # identical projects of the groups fetch (and build) once
+        share_base = CONFIG.data_dir.joinpath('cache')
+        share_base.mkdir(parents=True, exist_ok=True)
+        env.share_dir = tempfile.mkdtemp(prefix='share.', dir=share_base)
+        for grp_env in envs:
+            grp_env.share_dir = env.share_dir
+
+    # parsed once, before workers are forked
+    INST_METHODS.load()
+    queues = init_queues(env=env, envs=envs if len(envs) > 1 else None)
     try:
         if env.delete:
             git_projects = del_projects(env=env, git_projects=git_projects,
@@ -136,15 +245,31 @@ def call() -> int:
                 except BrokenPipeError:
                     pass
         end_queues(env=env, queues=queues)
-        lock(env=env, unlock=True)
+        for grp_env in envs:
+            lock(env=grp_env, unlock=True)
         print()
-        CONFIG.add({'grp_path': env.prefix})
+        for launcher in launchers:
+            if launcher in snapshots:
+                report_stats(launcher, snapshots[launcher])
+        if env.share_dir is not None:
+            report(env.share_dir)
+            shutil.rmtree(env.share_dir, ignore_errors=True)
+        for grp_env, compiler_cache in zip(envs, compiler_caches):
+            CONFIG.add({'grp_path': grp_env.prefix})
+            group = CONFIG.find(grp_env.prefix)
+            if group is not None:
+                group.compiler_cache = compiler_cache
         CONFIG.prune()
         CONFIG.store()
         print('done.', mark=1)
     except KeyboardInterrupt:
         interrupt(queues)
+        if env.share_dir is not None:
+            shutil.rmtree(env.share_dir, ignore_errors=True)
         return 1
+    finally:
+        if ssh_mux is not None:
+            ssh_mux.stop()
     return 0
 
 
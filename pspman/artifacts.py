@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8; mode:python -*-
+#
+# Copyright 2020 Pradyumna Paranjape
+# This file is part of pspman.
+#
+# pspman is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pspman is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with pspman.  If not, see <https://www.gnu.org/licenses/>.
+#
+'''
+Content-addressed cache of installed files
+
+An artifact is the set of files that an installation put in the prefix,
+stored as <data_dir>/artifacts/<key[:2]>/<key>.tar.gz.
+Its key hashes everything that determines those files:
+HEAD commit, installation method and its instructions,
+``inst_argv``, ``sh_env`` and the prefix (unless the method is relocatable).
+
+Files are attributed to an installation by comparing snapshots of the prefix.
+Writers that know their files (restores, merges) declare them to open captures.
+Files that changed while another capture in the same prefix was open can't be
+told apart: they are set aside, and such captures are not cached.
+
+'''
+
+
+import os
+import json
+import time
+import uuid
+import typing
+import hashlib
+import tarfile
+import contextlib
+from pathlib import Path
+from . import CONFIG
+from .shell import git_head, git_dirty
+from .classes import GitProject
+
+
+Snapshot = typing.Dict[str, typing.Tuple[int, int]]
+'''
+relative path: (mtime_ns, size) of files and links in a prefix
+'''
+
+CLOCK_SLACK_NS = 50_000_000
+'''
+File times lag behind the clock by up to a timer tick:
+files changed this long before a capture opened may be its own
+'''
+
+
+def artifact_dir() -> Path:
+    '''
+    Directory that holds artifacts
+    '''
+    return CONFIG.data_dir.joinpath('artifacts')
+
+
+def artifact_key(code_path: Path, i_type: str,
+                 instruct: typing.Dict[str, typing.Any],
+                 project: GitProject,
+                 prefix: typing.Optional[Path]) -> typing.Optional[str]:
+    '''
+    Key that identifies the installed files
+
+    Args:
+        code_path: path to source code
+        i_type: installation method
+        instruct: instructions of the method
+        project: project being installed
+        prefix: installation prefix, ``None``: installed files are relocatable
+
+    Returns:
+        hex digest, ``None`` if the source code is not a clean commit
+    '''
+    head = git_head(clone_dir=code_path)
+    if head is None or git_dirty(clone_dir=code_path) is not False:
+        return None
+    inputs = {'head': head, 'method': i_type, 'instruct': instruct,
+              'inst_argv': list(project.inst_argv),
+              'sh_env': project.sh_env}
+    if prefix is not None:
+        inputs['prefix'] = str(prefix)
+    return hashlib.sha256(
+        json.dumps(inputs, sort_keys=True).encode('utf-8')
+    ).hexdigest()
+
+
+def _artifact(key: str, cache: Path = None) -> Path:
+    '''
+    Location of artifact in cache [default: ``artifact_dir``]
+    '''
+    return (cache or artifact_dir()).joinpath(key[:2], f'{key}.tar.gz')
+
+
+def snapshot(prefix: Path,
+             exclude: typing.Iterable[Path] = ()) -> Snapshot:
+    '''
+    Files and links in prefix
+
+    Args:
+        prefix: installation prefix
+        exclude: directories that are not scanned
+
+    Returns:
+        Snapshot of prefix
+    '''
+    skip = {str(Path(path).resolve()) for path in exclude}
+    state: Snapshot = {}
+    base = len(str(prefix)) + 1
+    stack = [str(prefix)]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if os.path.realpath(entry.path) not in skip:
+                            stack.append(entry.path)
+                        continue
+                    stat = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                state[entry.path[base:]] = (stat.st_mtime_ns, stat.st_size)
+    return state
+
+
+def changed(before: Snapshot, after: Snapshot) -> typing.List[str]:
+    '''
+    Files created or modified between snapshots
+
+    Args:
+        before: earlier snapshot
+        after: later snapshot
+
+    Returns:
+        Sorted relative paths
+    '''
+    return sorted(path for path, state in after.items()
+                  if before.get(path) != state)
+
+
+class Capture():
+    '''
+    Files put in prefix while the capture was open
+
+    Attributes:
+        files: captured relative paths
+        shared: relative paths changed while another capture in the prefix
+            was open, which may belong to either
+    '''
+    def __init__(self):
+        self.files: typing.List[str] = []
+        self.shared: typing.List[str] = []
+
+
+def _notify(marker: Path, lines: typing.Iterable[str]):
+    '''
+    Inform an overlapping capture about writes to the prefix
+    '''
+    try:
+        note_fd = os.open(marker, os.O_WRONLY | os.O_APPEND)
+    except OSError:
+        # finished meanwhile
+        return
+    try:
+        os.write(note_fd, ''.join(f'{line}\n' for line in lines).encode())
+    finally:
+        os.close(note_fd)
+
+
+def _notify_captures(marker: Path,
+                     lines: typing.Iterable[str]) -> typing.List[str]:
+    '''
+    Inform open captures (other than own marker) about own writes
+
+    Returns:
+        Names of markers of the informed captures
+    '''
+    informed: typing.List[str] = []
+    for other in marker.parent.iterdir():
+        if other != marker and other.name.startswith('capture.'):
+            _notify(other, lines)
+            informed.append(other.name)
+    return informed
+
+
+def _windows(notes: typing.Iterable[str],
+             end: int) -> typing.List[typing.Tuple[int, int]]:
+    '''
+    Times (ns) during which other captures were open, from their notes
+    '''
+    opened: typing.Dict[str, int] = {}
+    closed: typing.Dict[str, int] = {}
+    for line in notes:
+        event, _, other = line.partition(' ')
+        name, _, stamp = other.partition(' ')
+        if event == '/open':
+            opened[name] = min(int(stamp), opened.get(name, int(stamp)))
+        elif event == '/close':
+            closed[name] = int(stamp)
+    return [(start - CLOCK_SLACK_NS, closed.get(name, end))
+            for name, start in opened.items()]
+
+
+@contextlib.contextmanager
+def occupy(prefix: Path, paths: typing.List[str] = None
+           ) -> typing.Iterator[Path]:
+    '''
+    Leave a marker in prefix/.pspman.capture while writing to prefix.
+    Open captures are informed about the writes when they begin and end.
+
+    Args:
+        prefix: installation prefix
+        paths: relative paths that shall be written,
+            ``None`` for unknown writes (capture)
+
+    Yields:
+        own marker; a capture's marker collects lines:
+
+            * ``/open <marker> <ns>``: another capture opened
+              (at 0: it was open already)
+            * ``/close <marker> <ns>``: another capture closed
+            * other lines: paths written by others
+    '''
+    kind = 'capture' if paths is None else 'write'
+    marker_dir = prefix.joinpath('.pspman.capture')
+    marker_dir.mkdir(exist_ok=True)
+    marker = marker_dir.joinpath(f'{kind}.{os.getpid()}.{uuid.uuid4().hex}')
+    marker.touch()
+    try:
+        if paths is None:
+            open_already = _notify_captures(
+                marker, (f'/open {marker.name} {time.time_ns()}',)
+            )
+            _notify(marker, (f'/open {other} 0' for other in open_already))
+        else:
+            _notify_captures(marker, paths)
+        yield marker
+        _notify_captures(marker, paths if paths is not None
+                         else (f'/close {marker.name} {time.time_ns()}',))
+    finally:
+        marker.unlink()
+
+
+@contextlib.contextmanager
+def capture(prefix: Path,
+            exclude: typing.Iterable[Path] = ()) -> typing.Iterator[Capture]:
+    '''
+    Capture files put in prefix during the context.
+    Files that others declared to write meanwhile are not captured.
+    Files changed (``st_ctime``) while another capture was open are set
+    aside as shared.
+
+    Args:
+        prefix: installation prefix
+        exclude: directories that are not scanned
+
+    '''
+    exclude = list(exclude) + [prefix.joinpath('.pspman.capture')]
+    result = Capture()
+    with occupy(prefix) as marker:
+        before = snapshot(prefix, exclude)
+        yield result
+        after = snapshot(prefix, exclude)
+        notes = marker.read_text().splitlines()
+        windows = _windows(notes, time.time_ns())
+        written = set(notes)
+        for path in changed(before, after):
+            if path in written:
+                continue
+            try:
+                ctime = os.lstat(prefix.joinpath(path)).st_ctime_ns
+            except OSError:
+                # removed meanwhile
+                continue
+            if any(start <= ctime <= end for start, end in windows):
+                result.shared.append(path)
+            else:
+                result.files.append(path)
+
+
+def store(key: str, prefix: Path, files: typing.List[str],
+          cache: Path = None) -> bool:
+    '''
+    Store files as artifact
+
+    Args:
+        key: artifact key
+        prefix: installation prefix
+        files: relative paths in prefix
+        cache: directory that holds artifacts [default: ``artifact_dir``]
+
+    Returns:
+        ``True`` if stored
+    '''
+    if not files:
+        return False
+    target = _artifact(key, cache)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    part = target.with_name(f'.{target.name}.{os.getpid()}')
+    try:
+        with tarfile.open(part, 'w:gz') as tar_h:
+            for rel_path in files:
+                tar_h.add(prefix.joinpath(rel_path), arcname=rel_path,
+                          recursive=False)
+        os.replace(part, target)
+    except OSError:
+        if part.exists():
+            part.unlink()
+        return False
+    return True
+
+
+def restore(key: str, prefix: Path,
+            cache: Path = None) -> typing.Optional[typing.List[str]]:
+    '''
+    Restore artifact into prefix
+
+    Args:
+        key: artifact key
+        prefix: installation prefix
+        cache: directory that holds artifacts [default: ``artifact_dir``]
+
+    Returns:
+        Restored relative paths, ``None`` if there is no (valid) artifact
+    '''
+    source = _artifact(key, cache)
+    if not source.is_file():
+        return None
+    try:
+        with tarfile.open(source, 'r:gz') as tar_h:
+            members = tar_h.getmembers()
+            for member in members:
+                if (Path(member.name).is_absolute()
+                        or '..' in Path(member.name).parts
+                        or not (member.isfile() or member.issym())):
+                    return None
+            with occupy(prefix, [member.name for member in members]):
+                for member in members:
+                    dest = prefix.joinpath(member.name)
+                    if dest.is_symlink() or dest.is_file():
+                        # installed files may be read-only
+                        dest.unlink()
+                    if hasattr(tarfile, 'tar_filter'):
+                        tar_h.extract(member, prefix, filter='tar')
+                    else:
+                        tar_h.extract(member, prefix)
+    except (OSError, tarfile.TarError):
+        return None
+    return [member.name for member in members]
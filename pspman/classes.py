@@ -49,6 +49,21 @@ class InstallEnv():
         verbose: print semi-verbose output
         install: install (clone) from remote urls
         delete: delete projects
+        jobs: parallel jobs budget of each worker (set by the queue)
+        retries: retries of network actions after transient failures
+        host_jobs: simultaneous connections to a remote host (0: no limit)
+        ssh_mux: multiplex ssh connections to each host during the run
+        git_backend: name of git backend {cli,inproc}
+        offline: don't contact remotes, fetch only from local sources
+        drop_dir: directory with bundles/clones named after projects
+        url_rewrite: remote url prefix: local path prefix
+        incremental: retain build directories and builds between updates
+        compiler_cache: compiler cache (ccache, sccache) launching compilers
+        artifact_cache: restore previously installed files instead of building
+        staged: install in a private staging root, then merge into prefix
+        git_timeout: seconds allowed to git network actions, ``None``: no limit
+        share_dir: run-scoped directory through which groups updated together
+            share fetches and builds, ``None``: nothing is shared
 
 
     Args:
@@ -67,6 +82,25 @@ class InstallEnv():
         self.reset: typing.List[str] = kwargs.get('reset', [])
         self.install: typing.List[str] = kwargs.get('install', [])
         self.delete: typing.List[str] =  kwargs.get('delete', [])
+        self.jobs: int = int(kwargs.get('jobs', 1))
+        self.retries: int = int(kwargs.get('retries', 3))
+        self.host_jobs: int = int(kwargs.get('host_jobs', 4))
+        self.ssh_mux: bool = kwargs.get('ssh_mux', False)
+        self.git_backend: str = kwargs.get('git_backend', 'cli')
+        self.offline: bool = kwargs.get('offline', False)
+        self.drop_dir: typing.Optional[str] = kwargs.get('drop_dir',
+                                                         config.drop_dir)
+        self.url_rewrite: typing.Dict[str, str] = kwargs.get(
+            'url_rewrite', config.url_rewrite
+        )
+        self.incremental: bool = kwargs.get('incremental', False)
+        self.compiler_cache: typing.Optional[str] = kwargs.get(
+            'compiler_cache'
+        )
+        self.artifact_cache: bool = kwargs.get('artifact_cache', False)
+        self.staged: bool = kwargs.get('staged', False)
+        self.git_timeout: typing.Optional[float] = kwargs.get('git_timeout')
+        self.share_dir: typing.Optional[str] = kwargs.get('share_dir')
 
     @property
     def prefix(self) -> Path:
@@ -105,6 +139,16 @@ class InstallEnv():
         Only Pull: {self.pull}
         Don't Update: {self.stale}
         Verbose Debugging: {self.verbose}
+        Network Retries: {self.retries}
+        Connections per Host: {self.host_jobs or 'unlimited'}
+        Multiplex SSH: {self.ssh_mux}
+        Git Backend: {self.git_backend}
+        Offline: {self.offline}
+        Drop Directory: {self.drop_dir}
+        Incremental Builds: {self.incremental}
+        Compiler Cache: {self.compiler_cache}
+        Artifact Cache: {self.artifact_cache}
+        Staged Installs: {self.staged}
 
         '''
 
@@ -141,6 +185,14 @@ class GitProject():
         inst_argv: arguments suffixed to optional args before positional args
         pull: only pull this project, don't run install scripts
         last_updated: last updated on datetime
+        i_type: detected installation method
+        fingerprint: indicators of installation method when it was detected
+        timeout: wall-clock seconds allowed to each installation step,
+            overrides instructions
+        limits: resource limits of each installation step,
+            override instructions
+        group: prefix of the project's group when projects of several
+            groups share queues (not recorded in the database)
 
     '''
     def __init__(self, **kwargs) -> None:
@@ -151,6 +203,11 @@ class GitProject():
         self.inst_argv: typing.List[str] = kwargs.get('inst_argv', [])
         self.sh_env: typing.Dict[str, str] = kwargs.get('sh_env', {})
         self.pull: bool = kwargs.get('pull', False)
+        self.i_type: typing.Optional[str] = kwargs.get('i_type')
+        self.fingerprint: typing.Optional[str] = kwargs.get('fingerprint')
+        self.timeout: typing.Optional[float] = kwargs.get('timeout')
+        self.limits: typing.Dict[str, typing.Any] = kwargs.get('limits', {})
+        self.group: typing.Optional[str] = kwargs.get('group')
 
         # Infer from parent.__dict__
         if kwargs.get('data') is not None:
@@ -187,6 +244,23 @@ class GitProject():
         for key, val in data.items():
             self.__dict__[key] = self.__dict__.get(key) or val
 
+    @property
+    def key(self) -> str:
+        '''
+        Index of project in queues: name, qualified by group if set
+        '''
+        if self.group is None:
+            return self.name
+        return f'{self.group}:{self.name}'
+
+    def record(self) -> typing.Dict[str, typing.Any]:
+        '''
+        Attributes recorded in the group's database
+
+        '''
+        return {key: val for key, val in self.__dict__.items()
+                if key != 'group'}
+
     def mark_update_time(self):
         '''
         Mark that the project was updated
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8; mode:python -*-
+#
+# Copyright 2020 Pradyumna Paranjape
+# This file is part of pspman.
+#
+# pspman is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pspman is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with pspman.  If not, see <https://www.gnu.org/licenses/>.
+#
+'''
+Compiler caches (ccache, sccache) launching compilers during installation
+
+The cache is kept in <data_dir>/cache/<launcher>.
+
+'''
+
+
+import os
+import json
+import shutil
+import typing
+from pathlib import Path
+from . import print, CONFIG
+from .shell import process_comm
+
+
+COMPILER_CACHES: typing.Dict[str, str] = {
+    'ccache': 'CCACHE_DIR',
+    'sccache': 'SCCACHE_DIR',
+}
+'''
+Supported compiler caches: environment variable locating the cache
+'''
+
+
+def cache_dir(launcher: str) -> Path:
+    '''
+    Directory that holds the cache of launcher
+
+    Args:
+        launcher: compiler cache in ``COMPILER_CACHES``
+
+    Returns:
+        Path to cache
+    '''
+    return CONFIG.data_dir.joinpath('cache', launcher)
+
+
+def cache_env(launcher: typing.Optional[str]) -> typing.Dict[str, str]:
+    '''
+    Environment variables that direct launcher to pspman's cache
+
+    Args:
+        launcher: compiler cache in ``COMPILER_CACHES``
+
+    Returns:
+        Modifications in shell env variables, empty if launcher is unknown
+    '''
+    if launcher not in COMPILER_CACHES:
+        return {}
+    return {COMPILER_CACHES[launcher]: str(cache_dir(launcher))}
+
+
+def available(launcher: typing.Optional[str]) -> bool:
+    '''
+    Is the launcher a supported compiler cache found in PATH?
+
+    Args:
+        launcher: compiler cache
+
+    '''
+    return launcher in COMPILER_CACHES and shutil.which(launcher) is not None
+
+
+def snapshot_stats(launcher: str
+                   ) -> typing.Optional[typing.Tuple[int, int]]:
+    '''
+    Statistics of launcher at the start of a run, against which the run's
+    hits are reported. Statistics are not zeroed: they may belong to another
+    run that is yet to report them.
+    An sccache server that is already running keeps its own cache location.
+
+    Args:
+        launcher: compiler cache in ``COMPILER_CACHES``
+
+    Returns:
+        hits, misses; ``None`` if statistics couldn't be read
+    '''
+    cache_dir(launcher).mkdir(parents=True, exist_ok=True)
+    return cache_stats(launcher)
+
+
+def cache_stats(launcher: str) -> typing.Optional[typing.Tuple[int, int]]:
+    '''
+    Hits and misses counted by launcher
+
+    Args:
+        launcher: compiler cache in ``COMPILER_CACHES``
+
+    Returns:
+        hits, misses; ``None`` if statistics couldn't be read
+    '''
+    env = {**os.environ, **cache_env(launcher)}
+    try:
+        if launcher == 'sccache':
+            stdout = process_comm(launcher, '--show-stats',
+                                  '--stats-format=json', p_name='sccache',
+                                  fail_handle='report', env=env)
+            if stdout is None:
+                return None
+            stats = json.loads(stdout)['stats']
+            return (sum(stats['cache_hits']['counts'].values()),
+                    sum(stats['cache_misses']['counts'].values()))
+        stdout = process_comm(launcher, '--print-stats', p_name='ccache',
+                              fail_handle='report', env=env)
+        if stdout is None:
+            return None
+        counts: typing.Dict[str, int] = {}
+        for line in stdout.splitlines():
+            key, _, val = line.partition('\t')
+            if val.strip().isdigit():
+                counts[key.strip()] = int(val)
+        return (counts.get('direct_cache_hit', 0)
+                + counts.get('preprocessed_cache_hit', 0),
+                counts.get('cache_miss', 0))
+    except (ValueError, KeyError, AttributeError):
+        return None
+
+
+def report_stats(launcher: str,
+                 since: typing.Optional[typing.Tuple[int, int]]):
+    '''
+    Print hit rate of the run
+
+    Args:
+        launcher: compiler cache in ``COMPILER_CACHES``
+        since: statistics at the start of the run (``snapshot_stats``)
+
+    '''
+    stats = cache_stats(launcher)
+    if stats is None or since is None:
+        print(f'{launcher} statistics are unavailable', mark='warn')
+        return
+    # builds of overlapping runs are counted too
+    hits, misses = stats[0] - since[0], stats[1] - since[1]
+    if hits + misses == 0:
+        return
+    print(f'{launcher}: {hits} hits, {misses} misses '
+          + f'({100 * hits / (hits + misses):.0f}% hit rate)', mark='info')
+
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8; mode:python -*-
+#
+# Copyright 2020 Pradyumna Paranjape
+# This file is part of pspman.
+#
+# pspman is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pspman is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with pspman.  If not, see <https://www.gnu.org/licenses/>.
+#
+'''
+Shell completion of project and group names from index files
+
+Completion must not load state databases or scan C_DIR.
+Names are served from small index files that state writers keep current:
+
+    * C_DIR/.pspman.index: project names; lines ``+name`` (registered)
+      and ``-name`` (deleted) are appended as states change,
+      and the file is rewritten whenever the database is consolidated.
+    * config_dir/groups.index: group names, one per line,
+      rewritten with the configuration (``MetaConfig.store``).
+
+'''
+
+
+import os
+import typing
+from pathlib import Path
+from .config import _config_dir, _data_dir, group_index
+
+
+def index_path(clone_dir: Path) -> Path:
+    '''
+    Index of projects in clone_dir
+    '''
+    return Path(clone_dir).joinpath('.pspman.index')
+
+
+def write_index(clone_dir: Path, names: typing.Iterable[str]):
+    '''
+    Rewrite index of projects
+
+    Args:
+        clone_dir: directory in which, projects are cloned
+        names: names of registered projects
+
+    '''
+    index = index_path(clone_dir)
+    part = index.with_name(f'.{index.name}.{os.getpid()}')
+    part.write_text(''.join(f'+{name}\n' for name in names))
+    os.replace(part, index)
+
+
+def _append(clone_dir: Path, line: str):
+    '''
+    Append a line to index (a single write: not interleaved)
+    '''
+    try:
+        index_fd = os.open(index_path(clone_dir),
+                           os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    except OSError:
+        return
+    try:
+        os.write(index_fd, f'{line}\n'.encode())
+    finally:
+        os.close(index_fd)
+
+
+def index_add(clone_dir: Path, name: str):
+    '''
+    Register project in index
+
+    Args:
+        clone_dir: directory in which, project is cloned
+        name: name of project
+
+    '''
+    _append(clone_dir, f'+{name}')
+
+
+def index_drop(clone_dir: Path, name: str):
+    '''
+    Remove project from index
+
+    Args:
+        clone_dir: directory in which, project was cloned
+        name: name of project
+
+    '''
+    _append(clone_dir, f'-{name}')
+
+
+def read_index(clone_dir: Path) -> typing.List[str]:
+    '''
+    Names of registered projects
+
+    Args:
+        clone_dir: directory in which, projects are cloned
+
+    Returns:
+        project names, in order of registration
+    '''
+    names: typing.Dict[str, None] = {}
+    try:
+        lines = index_path(clone_dir).read_text().splitlines()
+    except OSError:
+        return []
+    for line in lines:
+        if line.startswith('+'):
+            names[line[1:]] = None
+        elif line.startswith('-'):
+            names.pop(line[1:], None)
+    return list(names)
+
+
+def read_groups(config_dir: Path) -> typing.List[str]:
+    '''
+    Names of known groups
+
+    Args:
+        config_dir: pspman configuration directory
+
+    Returns:
+        group names
+    '''
+    try:
+        return group_index(config_dir).read_text().split()
+    except OSError:
+        return []
+
+
+def project_completer(prefix: str, parsed_args, **_) -> typing.List[str]:
+    '''
+    argcomplete completer: projects of the group selected on command line
+
+    Args:
+        prefix: typed part of name
+        parsed_args: arguments parsed so far
+
+    Returns:
+        matching project names
+    '''
+    clone_dir = getattr(parsed_args, 'clone_dir', None)
+    if clone_dir is None:
+        grp_path = getattr(parsed_args, 'prefix', None)\
+            or _data_dir(create=False)
+        clone_dir = Path(grp_path).joinpath('src')
+    if not Path(clone_dir).is_dir():
+        # completion doesn't create pspman's directories
+        return []
+    return [name for name in read_index(clone_dir) if name.startswith(prefix)]
+
+
+def group_completer(prefix: str, **_) -> typing.List[str]:
+    '''
+    argcomplete completer: known groups
+
+    Args:
+        prefix: typed part of name
+
+    Returns:
+        matching group names
+    '''
+    config_dir = _config_dir(create=False)
+    if not config_dir.is_dir():
+        # completion doesn't create pspman's directories
+        return []
+    return [name for name in read_groups(config_dir)
+            if name.startswith(prefix)]
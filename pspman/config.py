@@ -24,13 +24,14 @@ Configuration
 
 
 import os
+import fcntl
 from pathlib import Path
 import typing
-import yaml
 from .errors import PathNameError
 
 
-def _config_dir(config: typing.Union[str, os.PathLike] = None) -> Path:
+def _config_dir(config: typing.Union[str, os.PathLike] = None,
+                create: bool = True) -> Path:
     '''
     Guess the default configuration path based on XDG_CONFIG_HOME variable
     Following paths are checked in order until a feasable target is found
@@ -43,6 +44,7 @@ def _config_dir(config: typing.Union[str, os.PathLike] = None) -> Path:
 
     Args:
         config: recommended config directory
+        create: create the directory, ``False``: only locate it
 
     Returns:
         Path to config dir
@@ -60,26 +62,30 @@ def _config_dir(config: typing.Union[str, os.PathLike] = None) -> Path:
     config_var = os.environ.get('XDG_CONFIG_HOME')
     if config_var is not None:
         config_path = Path(config_var).joinpath('pspman')
-        config_path.mkdir(parents=True, exist_ok=True)
+        if create:
+            config_path.mkdir(parents=True, exist_ok=True)
         return config_path.resolve()
     home_dir = os.environ.get('HOME')
     if home_dir is None:
         # On which wierd operating system is this installed!
         config_path = Path(".pspman")
-        config_path.mkdir(parents=True, exist_ok=True)
+        if create:
+            config_path.mkdir(parents=True, exist_ok=True)
         return config_path.resolve()
     config_dir = Path(home_dir).joinpath('.config')
     config_path = config_dir.joinpath('pspman')
     if config_dir.is_dir():
-        config_path.mkdir(parents=True, exist_ok=True)
+        if create:
+            config_path.mkdir(parents=True, exist_ok=True)
         return config_path.resolve()
     # Why don't you have .config!
     config_path = Path(home_dir).joinpath('.pspman')
-    config_path.mkdir(parents=True, exist_ok=True)
+    if create:
+        config_path.mkdir(parents=True, exist_ok=True)
     return config_path.resolve()
 
 
-def _data_dir(data: str = None) -> Path:
+def _data_dir(data: str = None, create: bool = True) -> Path:
     '''
     Guess the default data path based on XDG_DATA_HOME variable
     Following paths are checked in order until a feasable target is found
@@ -92,6 +98,7 @@ def _data_dir(data: str = None) -> Path:
 
     Args:
         data: recommended data directory
+        create: create the directory, ``False``: only locate it
 
     Returns:
         path to config dir
@@ -109,22 +116,26 @@ def _data_dir(data: str = None) -> Path:
     data_var = os.environ.get('XDG_DATA_HOME')
     if data_var is not None:
         data_path = Path(data_var).joinpath('pspman')
-        data_path.mkdir(parents=True, exist_ok=True)
+        if create:
+            data_path.mkdir(parents=True, exist_ok=True)
         return data_path.resolve()
     home_dir = os.environ.get('HOME')
     if home_dir is None:
         # On which wierd operating system is this installed!
         data_path = Path(".pspman")
-        data_path.mkdir(parents=True, exist_ok=True)
+        if create:
+            data_path.mkdir(parents=True, exist_ok=True)
         return data_path.resolve()
     data_dir = Path(home_dir).joinpath('.local', 'share')
     data_path = data_dir.joinpath('pspman')
     if data_dir.is_dir():
-        data_path.mkdir(parents=True, exist_ok=True)
+        if create:
+            data_path.mkdir(parents=True, exist_ok=True)
         return data_path.resolve()
     # Why don't you have .data!
     data_path = Path(home_dir).joinpath('.pspman')
-    data_path.mkdir(parents=True, exist_ok=True)
+    if create:
+        data_path.mkdir(parents=True, exist_ok=True)
     return data_path.resolve()
 
 
@@ -143,13 +154,15 @@ class GroupDB():
         grp_path: path to Group
         name: custom-name for group [default: leaf of path]
         exists: whether path exists
-        locked: locked by another process?
+        locked: in use by a running pspman?
         clone_type: type of clones (0[default], -1, 1)
 
             * 1: all projects are installable
             * -1: no project is installable (all are pull-only)
             * 0: heterogenous
 
+        compiler_cache: compiler cache (ccache, sccache) used for builds
+
     '''
     def __init__(self, **kwargs):
         grp_path = kwargs.get('grp_path')
@@ -158,6 +171,8 @@ class GroupDB():
         else:
             self._grp_path = str(grp_path)
         self.clone_type = int(kwargs.get('clone_type', 0))
+        self.compiler_cache: typing.Optional[str] =\
+            kwargs.get('compiler_cache')
 
         # Infer from parent.__dict__
         if 'data' in kwargs:
@@ -168,8 +183,14 @@ class GroupDB():
 
     @property
     def locked(self) -> bool:
-        if self.grp_path.joinpath('.proc.lock').exists():
-            return True
+        lock_path = self.grp_path.joinpath('.proc.lock')
+        if not lock_path.exists():
+            return False
+        with open(lock_path, 'r') as lock_fh:
+            try:
+                fcntl.flock(lock_fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return True
         return False
 
     @locked.setter
@@ -252,8 +273,20 @@ class GroupDB():
         exists: {self.exists}
         locked: {locked}
         clone_type: {clone_type}
+        compiler_cache: {self.compiler_cache}
         '''
 
+def group_index(config_dir: Path) -> Path:
+    '''
+    Index of group names (for shell completion)
+
+    Args:
+        config_dir: pspman configuration directory
+
+    '''
+    return Path(config_dir).joinpath('groups.index')
+
+
 class MetaConfig():
     '''
     Meta-Config bearing information about all GroupDBs
@@ -269,6 +302,8 @@ class MetaConfig():
         config_dir: pspman configuration directory
         data_dir: pspman default data directory
         opt_in: opted installation methods
+        drop_dir: local directory with bundles/clones of unreachable remotes
+        url_rewrite: remote url prefix: local path prefix
 
     '''
     def __init__(self, **kwargs):
@@ -277,6 +312,9 @@ class MetaConfig():
         self.config_dir = _config_dir(kwargs.get('config_dir'))
         self.data_dir = _data_dir(kwargs.get('data_dir'))
         self.opt_in: typing.List[str] = kwargs.get('opt_in') or []
+        self.drop_dir: typing.Optional[str] = kwargs.get('drop_dir')
+        self.url_rewrite: typing.Dict[str, str] =\
+            kwargs.get('url_rewrite') or {}
         for group in (kwargs.get('meta_db_dirs') or {}).values():
             self.add(group)
 
@@ -296,6 +334,23 @@ class MetaConfig():
             return
         self.meta_db_dirs[group.name] = group
 
+    def find(self, grp_path: typing.Union[str, os.PathLike]
+             ) -> typing.Optional[GroupDB]:
+        '''
+        Group located at path
+
+        Args:
+            grp_path: path to group
+
+        Returns:
+            ``None`` if no registered group is located at grp_path
+        '''
+        grp_path = Path(grp_path).resolve()
+        for group in self.meta_db_dirs.values():
+            if group.grp_path == grp_path:
+                return group
+        return None
+
     def remove(self, name: str):
         '''
         Remove group
@@ -331,21 +386,56 @@ class MetaConfig():
         psp_config = Path(psp_config_file)
         if not psp_config.is_file():
             return False
+        import yaml
         with open(psp_config, 'r') as conf_fh:
             groups_data: typing.Dict[str, dict] = yaml.safe_load(conf_fh)
         for group in groups_data.values():
             self.add(group)
         return True
 
+    def load_offline(self, offline_file: typing.Union[os.PathLike, str]
+                     ) -> bool:
+        '''
+        Load local sources for unreachable remotes
+
+        Format::
+
+            drop_dir: /path/to/drops
+            rewrite:
+              https://github.com/: /path/to/mirror/github/
+
+        Args:
+            offline_file: yaml file describing local sources
+
+        Returns:
+            ``True`` if file was successfully loaded
+        '''
+        offline_path = Path(offline_file)
+        if not offline_path.is_file():
+            return False
+        import yaml
+        with open(offline_path, 'r') as offline_fh:
+            offline: typing.Dict[str, typing.Any] =\
+                yaml.safe_load(offline_fh) or {}
+        if offline.get('drop_dir'):
+            self.drop_dir = str(Path(offline['drop_dir']).expanduser())
+        self.url_rewrite.update(offline.get('rewrite') or {})
+        return True
+
     def store(self):
         '''
         Refresh a configuration file
 
         '''
+        import yaml
         psp_config = self.config_dir.joinpath('config.yml')
         with open(psp_config, 'w') as conf_fh:
             for group_name, group_db in self.meta_db_dirs.items():
                 yaml.dump({group_name: group_db.__dict__}, conf_fh)
+        # served to shell completion
+        group_index(self.config_dir).write_text(
+            ''.join(f'{name}\n' for name in self.meta_db_dirs)
+        )
 
 
 def read_config(config_file: str = None) -> MetaConfig:
@@ -360,6 +450,7 @@ def read_config(config_file: str = None) -> MetaConfig:
     '''
     psp_config = _config_dir(config_file).joinpath('config.yml')
     config = MetaConfig()
+    config.load_offline(psp_config.with_name('offline.yml'))
     if config.load(psp_config):
         config.prune()
         return config
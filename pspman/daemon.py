@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8; mode:python -*-
+#
+# Copyright 2020 Pradyumna Paranjape
+# This file is part of pspman.
+#
+# pspman is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pspman is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with pspman.  If not, see <https://www.gnu.org/licenses/>.
+#
+'''
+Daemon that serves pspman calls with warm state
+
+``pspman daemon`` listens on <runtime_dir>/daemon.sock.
+A pspman call that finds it hands over (``hand_over``):
+its arguments, working directory and environment are sent
+along with its standard streams (file descriptors).
+The daemon forks a child per call, that runs the call as pspman would,
+with the configuration, parsed instructions and the registry of projects
+(databases, discovered clones) already loaded.
+
+Calls that change a group are queued: they wait for the calls on the group
+that were handed over earlier, instead of skipping the projects that those
+are handling.
+Calls are run by a daemon that uses the same configuration.
+Otherwise, or if ``PSPMAN_NO_DAEMON`` is set, they are run by pspman itself.
+Calls are handed over only through a runtime directory that is private to
+the user, to a daemon of the same user (``SO_PEERCRED``), and vice versa.
+
+'''
+
+
+import os
+import sys
+import json
+import array
+import fcntl
+import signal
+import socket
+import struct
+import typing
+from .errors import RuntimeDirError
+from .remote import runtime_dir
+
+
+SERVING = False
+'''
+This process runs a call handed over to the daemon
+'''
+
+
+def _send(conn: socket.socket, message: typing.Dict[str, typing.Any],
+          fds: typing.Sequence[int] = ()):
+    '''
+    Send message (json), prefixed by its length, and file descriptors
+    '''
+    body = json.dumps(message).encode('utf-8')
+    data = len(body).to_bytes(length=8, byteorder='big') + body
+    ancillary = [(socket.SOL_SOCKET, socket.SCM_RIGHTS,
+                  array.array('i', fds))] if fds else []
+    sent = conn.sendmsg([data], ancillary)
+    if sent < len(data):
+        conn.sendall(data[sent:])
+
+
+def _recv(conn: socket.socket
+          ) -> typing.Tuple[typing.Dict[str, typing.Any], typing.List[int]]:
+    '''
+    Receive a message sent by ``_send``
+
+    Raises:
+        EOFError: connection was closed
+    '''
+    fds = array.array('i')
+    header, ancillary, _, _ = conn.recvmsg(
+        8, socket.CMSG_LEN(3 * fds.itemsize)
+    )
+    for level, kind, data in ancillary:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            fds.frombytes(data[:len(data) - (len(data) % fds.itemsize)])
+    while header and len(header) < 8:
+        header += conn.recv(8 - len(header))
+    if len(header) < 8:
+        raise EOFError
+    size = int.from_bytes(header, byteorder='big')
+    body = b''
+    while len(body) < size:
+        chunk = conn.recv(size - len(body))
+        if not chunk:
+            raise EOFError
+        body += chunk
+    return json.loads(body.decode('utf-8')), list(fds)
+
+
+def _peer_uid(conn: socket.socket) -> int:
+    '''
+    User of the process at the other end of conn
+    '''
+    creds = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED,
+                            struct.calcsize('3i'))
+    return struct.unpack('3i', creds)[1]
+
+
+def hand_over() -> typing.Optional[int]:
+    '''
+    Hand the call (``sys.argv``) over to a running daemon
+
+    Returns:
+        Error code of the call, ``None`` if no daemon took it over
+    '''
+    if SERVING or os.environ.get('PSPMAN_NO_DAEMON'):
+        return None
+    try:
+        sock_path = runtime_dir(create=False).joinpath('daemon.sock')
+    except RuntimeDirError as err:
+        from . import print
+        print(f'Not handing over to the daemon: {err.args[-1]}', mark='warn')
+        return None
+    if not sock_path.exists():
+        return None
+    client = socket.socket(family=socket.AF_UNIX, type=socket.SOCK_STREAM)
+    try:
+        client.connect(str(sock_path))
+        if _peer_uid(client) != os.getuid():
+            # not our daemon
+            client.close()
+            return None
+        _send(client, {'argv': sys.argv[1:], 'cwd': os.getcwd(),
+                       'env': dict(os.environ)}, fds=(0, 1, 2))
+        reply, _ = _recv(client)
+    except (OSError, EOFError, ValueError):
+        client.close()
+        return None
+    if not reply.get('accepted'):
+        client.close()
+        return None
+    with client:
+        while True:
+            try:
+                return int(_recv(client)[0]['code'])
+            except KeyboardInterrupt:
+                # the call's process isn't in our process group
+                os.kill(reply['pid'], signal.SIGINT)
+            except (OSError, EOFError, ValueError):
+                return 1
+
+
+def _same_config() -> bool:
+    '''
+    Does the (handed over) environment locate the daemon's configuration?
+    '''
+    from . import CONFIG
+    from .config import _config_dir, _data_dir
+    return (_config_dir(None, create=False) == CONFIG.config_dir
+            and _data_dir(None, create=False) == CONFIG.data_dir)
+
+
+def _run(conn: socket.socket) -> int:
+    '''
+    Child: run the call received on conn
+
+    Returns:
+        Error code of the call
+    '''
+    global SERVING
+    if _peer_uid(conn) != os.getuid():
+        # not our call
+        return 0
+    request, fds = _recv(conn)
+    os.environ.clear()
+    os.environ.update(request['env'])
+    if len(fds) != 3 or not _same_config():
+        _send(conn, {'accepted': False})
+        return 0
+    os.chdir(request['cwd'])
+    for target, client_fd in enumerate(fds):
+        os.dup2(client_fd, target)
+        os.close(client_fd)
+    _send(conn, {'accepted': True, 'pid': os.getpid()})
+    SERVING = True
+    sys.argv = ['pspman'] + request['argv']
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    from .__main__ import call
+    child = os.getpid()
+    try:
+        code = call()
+    except SystemExit as err:
+        if os.getpid() != child:
+            # queue processes forked by the call
+            raise
+        code = err.code if isinstance(err.code, int) else 1
+    _send(conn, {'code': code or 0})
+    return code or 0
+
+
+def _config_stamp() -> typing.List[typing.Tuple[str, int, int]]:
+    '''
+    Path, mtime and size of configuration files
+    '''
+    from . import CONFIG
+    stamp = []
+    for name in 'config.yml', 'offline.yml':
+        try:
+            stat = CONFIG.config_dir.joinpath(name).stat()
+        except OSError:
+            continue
+        stamp.append((name, stat.st_mtime_ns, stat.st_size))
+    return stamp
+
+
+def _warm(stamp: typing.List[typing.Tuple[str, int, int]]
+          ) -> typing.List[typing.Tuple[str, int, int]]:
+    '''
+    Load configuration (again, if it changed since stamp),
+    instructions and registry, so that forked calls find them loaded
+
+    Returns:
+        stamp of loaded configuration
+    '''
+    from . import CONFIG
+    from .config import read_config
+    from .classes import InstallEnv
+    from .installations import INST_METHODS
+    from .serial_actions import warm_registry
+    new_stamp = _config_stamp()
+    if new_stamp != stamp:
+        # modules hold references to CONFIG: update it in place
+        fresh = read_config()
+        vars(CONFIG).clear()
+        vars(CONFIG).update(vars(fresh))
+        sys.modules[__package__].ENV = InstallEnv(CONFIG)  # type: ignore
+    INST_METHODS.refresh()
+    warm_registry(CONFIG)
+    return new_stamp
+
+
+def _reap():
+    '''
+    Collect exited children (calls)
+    '''
+    try:
+        while os.waitpid(-1, os.WNOHANG)[0] != 0:
+            pass
+    except ChildProcessError:
+        pass
+
+
+def serve() -> int:
+    '''
+    Serve calls until stopped (``pspman daemon --stop``, SIGTERM, SIGINT)
+
+    Returns:
+        Error code
+    '''
+    from . import print
+    # subsystems of calls, imported once
+    from . import __main__, serial_actions, fork_actions, queues, switch_env
+    try:
+        rt_dir = runtime_dir()
+    except RuntimeDirError as err:
+        print(err.args[-1], mark='err')
+        return 1
+    lock_fd = os.open(rt_dir.joinpath('daemon.lock'),
+                      os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        print('pspman daemon is already running', mark='err')
+        os.close(lock_fd)
+        return 1
+    sock_path = rt_dir.joinpath('daemon.sock')
+    if sock_path.exists():
+        # left by a daemon that died
+        sock_path.unlink()
+    server = socket.socket(family=socket.AF_UNIX, type=socket.SOCK_STREAM)
+    server.bind(str(sock_path))
+    server.listen()
+    server.settimeout(60)
+    rt_dir.joinpath('daemon.pid').write_text(str(os.getpid()))
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    stamp = _warm(_config_stamp())
+    print(f'pspman daemon serving on {sock_path}', mark='info')
+    try:
+        while True:
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                _reap()
+                stamp = _warm(stamp)
+                continue
+            stamp = _warm(stamp)
+            pid = os.fork()
+            if pid == 0:
+                code = 1
+                try:
+                    server.close()
+                    os.close(lock_fd)
+                    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                    code = _run(conn)
+                except SystemExit as err:
+                    # queue processes forked by the call
+                    code = err.code if isinstance(err.code, int) else 0
+                finally:
+                    sys.stdout.flush()
+                    sys.stderr.flush()
+                    os._exit(code)
+            conn.close()
+            _reap()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        server.close()
+        sock_path.unlink()
+        rt_dir.joinpath('daemon.pid').unlink()
+        os.close(lock_fd)
+    print('pspman daemon stopped', mark='info')
+    return 0
+
+
+def stop() -> int:
+    '''
+    Stop the running daemon (calls that it is running are completed)
+
+    Returns:
+        Error code
+    '''
+    from . import print
+    try:
+        pid = int(runtime_dir(create=False).joinpath('daemon.pid')
+                  .read_text())
+        os.kill(pid, signal.SIGTERM)
+    except (OSError, ValueError, RuntimeDirError):
+        print('pspman daemon is not running', mark='warn')
+        return 1
+    return 0
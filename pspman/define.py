@@ -25,31 +25,35 @@ Define variables from command line and defaults
 
 import os
 import sys
+import pwd
+import fcntl
 import typing
-import subprocess
+import functools
+import contextlib
 from pathlib import Path
 import argparse
 import shutil
-import argcomplete
-from psprint import print
-from . import CONFIG
-from .config import MetaConfig
-from .classes import InstallEnv
 from .tools import timeout
+from .completion import project_completer, group_completer
 
+if typing.TYPE_CHECKING:
+    from .config import MetaConfig
+    from .classes import InstallEnv
 
-def cli(config: MetaConfig = None) -> argparse.ArgumentParser:
+
+def cli(config: 'MetaConfig' = None) -> argparse.ArgumentParser:
     '''
-    Parse command line arguments
+    Parse command line arguments.
+    Configuration is not read to build the parser.
 
     Args:
-        config: configuration to be modified by command line inputs
+        config: configuration, whose data directory is the displayed default
+            prefix [default: ${XDG_DATA_HOME}/pspman]
 
     Returns:
         modified ``confing``
 
     '''
-    config = config or CONFIG
     description = '''
 
     \033[1;91mNOTICE: This is only intended for "user" packages.
@@ -58,7 +62,7 @@ def cli(config: MetaConfig = None) -> argparse.ArgumentParser:
     '''
 
 
-    d_pref = config.data_dir
+    d_pref = '${XDG_DATA_HOME}/pspman' if config is None else config.data_dir
     parser = argparse.ArgumentParser(
         description=description,
         formatter_class=argparse.RawTextHelpFormatter
@@ -81,16 +85,70 @@ def cli(config: MetaConfig = None) -> argparse.ArgumentParser:
                         help='force working with root permissions [DANGEROUS]')
     parser.add_argument('-p', '--prefix', type=str, nargs='?', metavar='PREF',
                         help=f'path for installation [default: {d_pref}]',
-                        default=d_pref)
+                        default=argparse.SUPPRESS)
     parser.add_argument('-c', '--clone-dir', type=str, nargs='?', default=None,
                         metavar='C_DIR', help=f'''Clone git repos in C_DIR.
 Please check if you want to add this to PATH.
 [default: PREF{os.sep}src]
 ''')
-    parser.add_argument('-r', '--reset', metavar='PROJ', type=str, nargs='*',
-                        default=[], help='clean-reset PROJ code')
-    parser.add_argument('-d', '--delete', metavar='PROJ', type=str, nargs='*',
-                        default=[], help='delete PROJ')
+    parser.add_argument('--all-groups', action='store_true',
+                        dest='all_groups',
+                        help='update projects of all known groups together')
+    parser.add_argument(
+        '--groups', type=str, nargs='+', metavar='GIT_GROUP',
+        default=argparse.SUPPRESS,
+        help='update projects of GIT_GROUP(s) (names or paths) together'
+    ).completer = group_completer  # type: ignore
+    parser.add_argument('--retries', type=int, default=3, metavar='N',
+                        help='retry transient network failures N times')
+    parser.add_argument('--git-timeout', type=float, default=None,
+                        metavar='SECS', dest='git_timeout',
+                        help='kill git network actions after SECS seconds')
+    parser.add_argument('--host-jobs', type=int, default=4, metavar='N',
+                        dest='host_jobs',
+                        help='simultaneous connections per remote host' +
+                        ' [0: unlimited]')
+    parser.add_argument('--ssh-mux', action='store_true', dest='ssh_mux',
+                        help='share one ssh connection per remote host')
+    parser.add_argument('--git-backend', type=str, default='cli',
+                        dest='git_backend', choices=('cli', 'inproc'),
+                        help='''git backend [default: cli]
+inproc: read-only queries are answered without calling git
+''')
+    parser.add_argument('--offline', action='store_true',
+                        help='fetch only from bundles/local directories')
+    parser.add_argument('--drop-dir', type=str, metavar='DIR',
+                        dest='drop_dir', default=argparse.SUPPRESS,
+                        help='''fetch unreachable projects from DIR/PROJ.bundle,
+DIR/PROJ.git or DIR/PROJ [default: from offline.yml]
+''')
+    parser.add_argument('--incremental', action='store_true',
+                        help='''retain builds between updates:
+build in PREF/incr_build/PROJ, skip clean-up after install
+''')
+    parser.add_argument('--compiler-cache', type=str, metavar='CACHE',
+                        dest='compiler_cache', default=argparse.SUPPRESS,
+                        choices=('ccache', 'sccache', 'none'),
+                        help='''launch compilers through CACHE (remembered
+for this group) {ccache,sccache,none}
+''')
+    parser.add_argument('--artifact-cache', action='store_true',
+                        dest='artifact_cache',
+                        help='''cache installed files by commit and build inputs,
+restore them instead of building the same commit again
+''')
+    parser.add_argument('--staged', action='store_true',
+                        help='''install each project in a private DESTDIR,
+then merge into PREF one project at a time, refusing conflicts
+''')
+    parser.add_argument(
+        '-r', '--reset', metavar='PROJ', type=str, nargs='*', default=[],
+        help='clean-reset PROJ code (and incremental build)'
+    ).completer = project_completer  # type: ignore
+    parser.add_argument(
+        '-d', '--delete', metavar='PROJ', type=str, nargs='*', default=[],
+        help='delete PROJ'
+    ).completer = project_completer  # type: ignore
     parser.add_argument('-i', '--install', metavar='URL', type=str, nargs='*',
                         default=[],
         help=f'''
@@ -120,15 +178,37 @@ format: "URL[___branch[___'only'|___inst_argv[___sh_env]]]"
         'with additional *PATH variables from PREFIX')
     switch.add_argument('switch_to', type=str, metavar='GIT_GROUP|PATH',
                         help="GIT_GROUP's name or path", nargs='?',
-                        default='default')
+                        default='default'
+                        ).completer = group_completer  # type: ignore
     switch.add_argument('-c', '--copy', action='store_true', dest='clipboard',
                         help='try to copy soruce command to clipboard')
     switch.set_defaults(call_function='switch')
 
+    daemon = sub_parsers.add_parser(
+        name='daemon', aliases=[],
+        help='serve pspman calls from a long-running process\n' +
+        'that keeps configuration, instructions and registry loaded'
+    )
+    daemon.add_argument('--stop', action='store_true',
+                        help='stop the running daemon')
+    daemon.set_defaults(call_function='daemon')
+
     unlock = sub_parsers.add_parser(name='unlock', aliases=[],
-                                    help='Unlock C_DIR and exit')
+                                    help='Recover C_DIR after a crashed run'
+                                    + ' and exit')
     unlock.set_defaults(call_function='unlock')
 
+    show_log = sub_parsers.add_parser(
+        name='log', aliases=['logs'],
+        help="display logs of PROJ's last (un)installation and exit"
+    )
+    show_log.add_argument('log_project', type=str, metavar='PROJ',
+                          help='name of project'
+                          ).completer = project_completer  # type: ignore
+    show_log.add_argument('step', type=str, nargs='?', default=None,
+                          help='only this step: serial number or command')
+    show_log.set_defaults(call_function='log')
+
     list_gits = sub_parsers.add_parser(
         name='list', aliases=['info'],
         help='display list of cloned repositories and exit'
@@ -150,13 +230,15 @@ format: "URL[___branch[___'only'|___inst_argv[___sh_env]]]"
     return parser
 
 
-def cli_opts(config: MetaConfig = None) -> typing.Dict[str, typing.Any]:
+def cli_opts(config: 'MetaConfig' = None) -> typing.Dict[str, typing.Any]:
     '''
     Parse cli arguments to return its dict
     '''
-    config = config or CONFIG
-    parser = cli()
-    argcomplete.autocomplete(parser)
+    parser = cli(config)
+    if '_ARGCOMPLETE' in os.environ:
+        # called by shell completion: argcomplete completes and exits
+        import argcomplete
+        argcomplete.autocomplete(parser)
     args = parser.parse_args()
     if args.info:
         setattr(args, 'call_function', 'info')
@@ -172,7 +254,22 @@ def cli_opts(config: MetaConfig = None) -> typing.Dict[str, typing.Any]:
     return vars(args)
 
 
-def perm_pass(env: InstallEnv, permdir: Path) -> int:
+@functools.lru_cache(maxsize=None)
+def _access(permdir: Path) -> typing.Tuple[bool, os.stat_result]:
+    '''
+    Are all rwx permissions granted on permdir? (cached for the process)
+
+    Args:
+        permdir: existing directory
+
+    Returns:
+        permission granted, stat of permdir
+    '''
+    return (os.access(permdir, os.R_OK | os.W_OK | os.X_OK),
+            os.stat(permdir))
+
+
+def perm_pass(env: 'InstallEnv', permdir: Path) -> int:
     '''
     Args:
         permdir: directory whose permissions are to be checked
@@ -181,6 +278,7 @@ def perm_pass(env: InstallEnv, permdir: Path) -> int:
         Error code: ``1`` if all rwx permissions are not granted
 
     '''
+    from . import print
     if env.verbose:
         print(f'Checking permissions for {permdir}')
     while not permdir.exists():
@@ -188,49 +286,34 @@ def perm_pass(env: InstallEnv, permdir: Path) -> int:
         permdir = permdir.resolve().parent
         if env.verbose:
             print(f'Checking permissions for the parent: {permdir}')
-    user = os.environ.get('USER', 'root')
-    stdout, err = subprocess.Popen(['stat', '-L', '-c', "%U %G %a", permdir],
-                                   text=True, stdout=subprocess.PIPE,
-                                   stderr=subprocess.PIPE).communicate()
-    if err:
+    try:
+        granted, stat = _access(permdir.resolve())
+    except OSError:
         print('Error checking directory permissions, aborting...', mark=5)
         return 1
-    owner, group, octperm = stdout.replace("\n", '').split(' ')
-    if (octperm[-1] == '7') != 0:
-        # everyone has access
+    if granted:
         return 0
-    if (octperm[-2] == '7') != 0:
-        # some group has permissions
-        stdout, err = subprocess.Popen(['groups', user], text=True,
-                                       stdout=subprocess.PIPE,
-                                       stderr=subprocess.PIPE).communicate()
-        if err:
-            # error
-            print('Error checking group permissions, aborting...', mark=5)
-            return 1
-        user_groups = stdout.split(' ')
-        for u_grp in user_groups:
-            if u_grp == group:
-                return 0
-    if (octperm[-3] == '7') != 0:
-        # owner has permissions
-        if user == owner:
-            return 0
+    user = os.environ.get('USER', 'root')
+    try:
+        owner = pwd.getpwuid(stat.st_uid).pw_name
+    except KeyError:
+        owner = str(stat.st_uid)
     print(f'''
-    We [{user}] do not have sufficient permissions [{octperm}]
+    We [{user}] do not have sufficient permissions [{stat.st_mode & 0o777:o}]
     on {owner}'s directory: {permdir}
     ''', mark=5)
     print('Try another location', mark=2)
     return 1
 
 
-def prepare_env(env: InstallEnv) -> int:
+def prepare_env(env: 'InstallEnv') -> int:
     '''
     Check permissions and create prefix and source directories
 
     Returns:
         Error code
     '''
+    from . import print
     # Am I root?
     if os.environ.get('USER', 'root').lower() == 'root':
         print('I hate dictators', mark=3)
@@ -262,47 +345,147 @@ def prepare_env(env: InstallEnv) -> int:
     return 0
 
 
-def lock(env: InstallEnv, unlock: bool = False, message: str = None):
+_HELD: typing.Dict[str, int] = {}
+'''
+Locks held by this process: path of lockfile: file descriptor
+'''
+
+
+def _flock(lock_path: Path, operation: int) -> typing.Optional[int]:
+    '''
+    Open lock_path and flock it without blocking
+
+    Returns:
+        file descriptor, ``None`` if another process holds the lock
+    '''
+    lock_fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(lock_fd, operation | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(lock_fd)
+        return None
+    return lock_fd
+
+
+def _queue(env: 'InstallEnv'):
+    '''
+    Wait for queued runs on the group that came earlier
     '''
-    Unlock up the directory
+    from . import print
+    queue_path = project_locks(env.clone_dir).joinpath('.queue')
+    if str(queue_path) in _HELD:
+        return
+    queue_path.parent.mkdir(parents=True, exist_ok=True)
+    queue_fd = _flock(queue_path, fcntl.LOCK_EX)
+    if queue_fd is None:
+        print(f'Waiting for another pspman call on {env.prefix}', mark='info')
+        queue_fd = os.open(queue_path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(queue_fd, fcntl.LOCK_EX)
+    _HELD[str(queue_path)] = queue_fd
+
+
+def lock(env: 'InstallEnv', unlock: bool = False, queue: bool = False
+         ) -> int:
+    '''
+    Lock the group for a run, or unlock it.
+
+    Runs share the lock on ``prefix/.proc.lock``; they exclude each other
+    per project (``lock_project``). Locks are ``flock`` s, released when
+    the process ends, so that a crashed run doesn't leave a stale lock.
 
     Args:
         env: installation context
-        unlock: unlock existing locks?
-        message: message to be written in the lockfile instead of pid
+        unlock: release own locks on the group, or (``pspman unlock``)
+            recover the group's state after a crashed run
+        queue: first wait for other queued runs on the group
+            (calls handed over to the daemon), instead of skipping
+            the projects that they are handling
 
     Returns:
-        Error code
+        Error code: ``0``: locked, ``1``: unlocked, ``2``: failed
 
     '''
+    from . import print
     lock_path = env.prefix.joinpath('.proc.lock')
-    # lockfile is deliberately human-readable
-
-    if lock_path.exists():
-        # directory is locked
+    if queue and not unlock:
+        _queue(env)
+    if unlock and str(lock_path) in _HELD:
+        for held in [path for path in _HELD
+                     if path == str(lock_path)
+                     or Path(path).parent == project_locks(env.clone_dir)]:
+            os.close(_HELD.pop(held))
+        return 1
+    lock_fd = _flock(lock_path,
+                     fcntl.LOCK_EX if unlock else fcntl.LOCK_SH)
+    if lock_fd is None:
         if unlock:
-            # restore all backup databases
-            for filetype in "healthy", "fail":
-                backup_file = env.clone_dir.joinpath(f".pspman.{filetype}.yml")
-                if backup_file.with_suffix('.yml.bak').is_file() and \
-                   not backup_file.is_file():
-                    backup_file.with_suffix(".yml.bak").replace(backup_file)
-            temp_build = env.prefix.joinpath('temp_build')
-            if temp_build.is_dir():
-                shutil.rmtree(temp_build)
-            lock_path.unlink()
-            return 1
-        with open(lock_path, 'r') as lock_fh:
-            print(f"This git-group was locked for safety by {lock_fh.read()}",
+            print(f"{env.prefix} is in use by a running pspman", mark='err')
+            print("Wait for it to complete", mark='act')
+        else:
+            print(f"{env.prefix} is being recovered by pspman unlock",
                   mark='err')
-        print("Either wait for the process to get completed")
-        print("OR interrupt the process and execute")
-        print(f"pspman -p {env.prefix} unlock", mark='act')
-        print("Interruption WILL generally MESS UP source codes.", mark='warn')
-        return 2
-    if unlock:
-        print(f'Lockfile {lock_path} not found.')
+            queue_path = str(project_locks(env.clone_dir).joinpath('.queue'))
+            if queue_path in _HELD:
+                os.close(_HELD.pop(queue_path))
         return 2
-    with open(lock_path, 'w') as lock_fh:
-        lock_fh.write(str(message) or 'pid:' + str(os.getpid()))
-    return 0
+    if not unlock:
+        _HELD[str(lock_path)] = lock_fd
+        return 0
+    # no run is alive: recover from a crashed run
+    for filetype in "healthy", "fail":
+        backup_file = env.clone_dir.joinpath(f".pspman.{filetype}.yml")
+        if backup_file.with_suffix('.yml.bak').is_file() and \
+           not backup_file.is_file():
+            backup_file.with_suffix(".yml.bak").replace(backup_file)
+    temp_build = env.prefix.joinpath('temp_build')
+    if temp_build.is_dir():
+        shutil.rmtree(temp_build)
+    os.close(lock_fd)
+    return 1
+
+
+def project_locks(clone_dir: Path) -> Path:
+    '''
+    Directory that holds lockfiles of projects in clone_dir
+    '''
+    return Path(clone_dir).joinpath('.pspman.locks')
+
+
+def lock_project(env: 'InstallEnv', name: str) -> bool:
+    '''
+    Lock project for the rest of the run (released with the group's lock)
+
+    Args:
+        env: installation context
+        name: name of project
+
+    Returns:
+        ``False`` if another run is working on the project
+    '''
+    from . import print
+    lock_path = project_locks(env.clone_dir).joinpath(name)
+    if str(lock_path) in _HELD:
+        return True
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    lock_fd = _flock(lock_path, fcntl.LOCK_EX)
+    if lock_fd is None:
+        print(f'{name} is being handled by another pspman run, skipping',
+              mark='warn')
+        return False
+    _HELD[str(lock_path)] = lock_fd
+    return True
+
+
+@contextlib.contextmanager
+def state_lock(clone_dir: Path) -> typing.Iterator[None]:
+    '''
+    Hold the group's lock on its state (databases) during the context.
+    Hold it briefly: every state commit of every run waits for it.
+
+    Args:
+        clone_dir: directory in which, projects are cloned
+
+    '''
+    with open(Path(clone_dir).joinpath('.pspman.state.lock'), 'w') as lock_fh:
+        fcntl.flock(lock_fh, fcntl.LOCK_EX)
+        yield
@@ -60,6 +60,18 @@ class GitURLError(PathNameError):
         super().__init__(self, 'GIT URL and/name not found/inferred')
 
 
+class RuntimeDirError(PSPManError):
+    '''
+    Runtime directory is not private to the user:
+    it is a symbolic link, owned by another user or accessible to others
+
+    Args:
+        run_dir: runtime directory
+    '''
+    def __init__(self, run_dir: typing.Union[str, os.PathLike]) -> None:
+        super().__init__(self, f'{run_dir} is not private to this user')
+
+
 class CommandError(PSPManError):
     '''
     Base class for subprocess failure
@@ -70,6 +82,8 @@ class CommandError(PSPManError):
 
     '''
     def __init__(self, cmd: list, err: str = None) -> None:
+        self.cmd = cmd
+        self.err = err
         super().__init__(self, f'''
         Command Passed for execution:
         {cmd}
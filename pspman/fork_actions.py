@@ -26,7 +26,7 @@ All `actions` accept same set of args and return same type of object
         * project: project on which action is requested
 
     Returns:
-        * project.name for indexing
+        * project.key for indexing
         * project.tag feedback to update parent
         * success code of action to inform parent
 
@@ -34,52 +34,155 @@ All `actions` accept same set of args and return same type of object
             * code == -1: Failed at action
             * code == 0: Nothing changed
 
+        * (optional) project attributes updated by the action
+
 
 '''
 
 
+import os
+import json
 import typing
 import shutil
+import hashlib
+import contextlib
 from pathlib import Path
 from . import print, CONFIG
-from .shell import git_clean, git_pull, git_clone
+from .shell import (git_clean, git_pull, git_clone, git_head, parse_limits,
+                    process_comm,
+                    git_submodule_update, git_submodule_status,
+                    git_pull_from, git_clone_from)
 from .classes import InstallEnv, GitProject
+from .remote import retry, local_sources
+from .artifacts import artifact_dir, artifact_key, capture, restore, store
+from .manifests import (REQUIREMENTS, remove_installed, drop_manifest,
+                        record_install, write_manifest)
+from .staging import staging, stage_env, merge
+from .logs import log_dir, step_log, clear_logs
+from .sharing import share_key, claim, record, tally
 from .tag import ACTION_TAG, FAIL_TAG, TAG_ACTION, RET_CODE
-from .installations import INST_METHODS, run_install
+from .installations import INST_METHODS, run_install, method_cache
 
 
-def delete(
-        args: typing.Tuple[InstallEnv, GitProject]
-) -> typing.Tuple[str, int, int]:
+def _net(env: InstallEnv) -> typing.Dict[str, typing.Any]:
     '''
-    Delete this project
+    Keyword arguments of network actions: they raise errors,
+    so that transient failures may be retried, and they time out.
+    '''
+    return {'fail_handle': 'fail', 'timeout': env.git_timeout}
+
+
+def _limits(project: GitProject) -> typing.Optional[typing.Dict[str, int]]:
+    '''
+    Resource limits of project's installation steps,
+    ``None`` if they are malformed
+    '''
+    try:
+        return parse_limits(project.limits or {})
+    except ValueError as err:
+        print(f'{project.name}: {err}', mark='err')
+        return None
+
+
+def _gitmodules(code_path: Path) -> typing.Optional[bytes]:
+    '''
+    Contents of .gitmodules in the project
 
     Args:
-        args:
-            * env: installation context
-            * project: project to delete
+        code_path: path to project's source code
 
     Returns:
-        project.name, project.tag, success code of action
+        ``None`` if the project doesn't declare submodules
 
     '''
-    env, project = args
-    print(f'''
-    Removing {project.name}.
+    gitmodules = code_path.joinpath('.gitmodules')
+    if not gitmodules.is_file():
+        return None
+    return gitmodules.read_bytes()
 
-    This project may be added again using:
-    pspman -i {project.url}
-    ''', mark='delete' )
-    # Attempt uninstallation
-    code_path = Path(env.clone_dir).joinpath(project.name)
-    i_type = None
+
+def _pending_submodules(env: InstallEnv, project: GitProject) -> Path:
+    '''
+    Marker of a failed update of project's submodules,
+    retried by the next update even if the superproject didn't move
+    '''
+    return Path(env.clone_dir).joinpath('.pspman.submodules', project.name)
+
+
+def _fingerprint(code_path: Path) -> typing.Optional[str]:
+    '''
+    Fingerprint of the indicators of installation method:
+    top-level listing of source code and known methods' indicators
+
+    Args:
+        code_path: path to project's source code
+
+    Returns:
+        hex digest, ``None`` if source code can't be listed
+    '''
+    try:
+        listing = sorted(os.listdir(code_path))
+    except OSError:
+        return None
+    methods = [(name, method.instruct.indicate, method.instruct.exdicate)
+               for name, method in sorted(INST_METHODS.items())]
+    return hashlib.sha1(
+        json.dumps([listing, methods]).encode('utf-8')
+    ).hexdigest()
+
+
+def _detect(code_path: Path, project: GitProject
+            ) -> typing.Tuple[typing.Optional[str], typing.Optional[str]]:
+    '''
+    Installation method of project.
+    The method cached on project is trusted while its fingerprint holds.
+
+    Args:
+        code_path: path to project's source code
+        project: project whose method is detected
+
+    Returns:
+        installation method (``None`` if unknown), fingerprint
+    '''
+    fingerprint = _fingerprint(code_path)
+    if fingerprint is not None and fingerprint == project.fingerprint\
+       and (project.i_type is None or project.i_type in INST_METHODS):
+        return project.i_type, fingerprint
     for method_name, method in INST_METHODS.items():
         if (any(code_path.joinpath(id_file).exists()
                 for id_file in method.instruct.indicate) and not
             any(code_path.joinpath(xd_file).exists()
                 for xd_file in method.instruct.exdicate)):
-            i_type = method_name
-            break
+            return method_name, fingerprint
+    return None, fingerprint
+
+
+def _scratch(env: InstallEnv) -> typing.List[Path]:
+    '''
+    Directories in (or as) prefix that are not installed files
+
+    Args:
+        env: installation context
+
+    Returns:
+        directories excluded from captures of installed files
+    '''
+    return [env.clone_dir, env.prefix.joinpath('temp_build'),
+            env.prefix.joinpath('incr_build'),
+            CONFIG.data_dir.joinpath('cache'), artifact_dir()]
+
+
+def _uninstall(env: InstallEnv, project: GitProject, code_path: Path):
+    '''
+    Uninstall project by the uninstallation steps of its install method
+
+    Args:
+        env: installation context
+        project: project to uninstall
+        code_path: path to project's source code
+
+    '''
+    i_type, fingerprint = _detect(code_path, project)
     if i_type is not None:
         # Known uninstallation method
         if env.verbose:
@@ -87,9 +190,15 @@ def delete(
             Trying standard uninstall calls with {i_type}.
             This may not always be clean; some scars may stay back.
             ''', mark='delete')
+        build_dir = env.prefix.joinpath('incr_build', project.name)\
+            if env.incremental else None
         success = run_install(i_type='u_' + i_type, code_path=code_path,
                               prefix=env.prefix, argv=project.inst_argv,
-                              env=project.sh_env)
+                              env=project.sh_env, build_dir=build_dir,
+                              launcher=env.compiler_cache, jobs=env.jobs,
+                              timeout=project.timeout,
+                              limits=_limits(project),
+                              logs=log_dir(env.clone_dir, project.name))
         if not success:
             if env.verbose:
                 print(f'FAILED Uninstalling project {project.name}',
@@ -100,16 +209,71 @@ def delete(
         if env.verbose:
             print(f'PSPMan was initialized only with {CONFIG.opt_in}')
 
+
+def delete(
+        args: typing.Tuple[InstallEnv, GitProject]
+) -> typing.Tuple[str, int, int]:
+    '''
+    Delete this project
+
+    Args:
+        args:
+            * env: installation context
+            * project: project to delete
+
+    Returns:
+        project.key, project.tag, success code of action
+
+    '''
+    env, project = args
+    print(f'''
+    Removing {project.name}.
+
+    This project may be added again using:
+    pspman -i {project.url}
+    ''', mark='delete' )
+    code_path = Path(env.clone_dir).joinpath(project.name)
+    try:
+        removed = remove_installed(env.clone_dir, project.name, env.prefix)
+    except OSError:
+        # manifest is kept: deletion may be retried
+        print(f'Failed Deleting {project.name}', mark='fdelete')
+        return project.key, project.tag, RET_CODE['fail']
+    if removed is not None:
+        # Recorded manifest: no need to build again for uninstallation
+        if env.verbose:
+            print(f'Removed {removed} installed file(s) of {project.name}',
+                  mark='delete')
+    else:
+        # Attempt uninstallation
+        _uninstall(env, project, code_path)
+    drop_manifest(env.clone_dir, project.name)
+
     # Erase source code
     if env.verbose:
         print('Erasing source code', mark='delete')
     try:
+        shutil.rmtree(env.prefix.joinpath('incr_build', project.name),
+                      ignore_errors=True)
+        shutil.rmtree(log_dir(env.clone_dir, project.name),
+                      ignore_errors=True)
         shutil.rmtree(Path(env.clone_dir).joinpath(project.name))
-        return project.name, project.tag & (0xff - ACTION_TAG['delete']),\
+        pending = _pending_submodules(env, project)
+        if pending.is_file():
+            pending.unlink()
+        if not any(entry.is_dir() and not entry.name.startswith('.')
+                   for entry in Path(env.clone_dir).iterdir()):
+            # last project: shared dependencies are not needed anymore
+            try:
+                remove_installed(env.clone_dir, REQUIREMENTS, env.prefix)
+            except OSError:
+                # reported; retried with the next last project
+                pass
+        return project.key, project.tag & (0xff - ACTION_TAG['delete']),\
             RET_CODE['pass']
     except OSError:
         print(f'Failed Deleting {project.name}', mark='fdelete')
-        return project.name, project.tag, RET_CODE['fail']
+        return project.key, project.tag, RET_CODE['fail']
 
 
 def clone(
@@ -124,26 +288,47 @@ def clone(
             * project: project to delete
 
     Returns:
-        project.name, project.tag, success code of action
+        project.key, project.tag, success code of action
 
     '''
     env, project = args
     if project.url is None:
         print(f'URL for {project.name} was not supplied', mark='err')
-        return project.name, project.tag, RET_CODE['fail']
-    gitkwargs: typing.Dict[str, typing.Optional[str]] = {}
+        return project.key, project.tag, RET_CODE['fail']
+    gitkwargs: typing.Dict[str, typing.Optional[str]] = {
+        'recurse-submodules': None, 'jobs': str(env.jobs)
+    }
     if project.branch is not None:
         gitkwargs['branch'] = project.branch
-    ret = git_clone(clone_dir=Path(env.clone_dir).joinpath(project.name),
-                    url=project.url, name=project.name, gitkwargs=gitkwargs)
+    code_path = Path(env.clone_dir).joinpath(project.name)
+    ret = None
+    unreachable = env.offline
+    if not env.offline:
+        ret, unreachable = retry(lambda: git_clone(
+            clone_dir=code_path, url=project.url, name=project.name,
+            gitkwargs=gitkwargs, prockwargs=_net(env)
+        ), url=project.url, retries=env.retries, host_jobs=env.host_jobs,
+                    name=project.name)
+    if ret is None and unreachable:
+        # submodules' remotes are not expected to be reachable either
+        del gitkwargs['recurse-submodules'], gitkwargs['jobs']
+        for source in local_sources(project.url, project.name,
+                                    drop_dir=env.drop_dir,
+                                    url_rewrite=env.url_rewrite):
+            ret = git_clone_from(clone_dir=code_path, source=source,
+                                 url=project.url, name=project.name,
+                                 gitkwargs=gitkwargs)
+            if ret is not None:
+                print(f'{project.name} cloned from {source}', mark='info')
+                break
     if ret is None:
         # STDERR thrown
         print(f'Failed to clone source of {project.name}', mark='fclone')
-        return (project.name, project.tag, RET_CODE['fail'])
+        return (project.key, project.tag, RET_CODE['fail'])
     if env.verbose:
         print(f'{project.name} cloned', mark='clone')
     tag = (project.tag | ACTION_TAG['install']) & (0xff - ACTION_TAG['pull'])
-    return project.name, tag, RET_CODE['pass']
+    return project.key, tag, RET_CODE['pass']
 
 
 def update(
@@ -158,33 +343,149 @@ def update(
             * project: project to delete
 
     Returns:
-        project.name, project.tag, success code of action
+        project.key, project.tag, success code of action
 
     '''
     env, project = args
     code_path = Path(env.clone_dir).joinpath(project.name)
-    g_pull = git_pull(clone_dir=code_path)
+    head = git_head(clone_dir=code_path)
+    modules = _gitmodules(code_path)
+    g_pull = None
+    local = False
+    share = share_key(project.url, project.branch)
+    with claim(env.share_dir, 'fetch', share) as peer:
+        if peer is not None:
+            # fetched by another group in this run
+            fetched = json.loads(peer)
+            g_pull = git_pull_from(clone_dir=code_path,
+                                   source=fetched['source'])
+            local = fetched['local']
+            if g_pull is not None and env.verbose:
+                print(f"{project.name} fetched from {fetched['source']}",
+                      mark='pull')
+        shared = g_pull is not None
+        unreachable = env.offline
+        if g_pull is None and not env.offline:
+            g_pull, unreachable = retry(
+                lambda: git_pull(clone_dir=code_path, prockwargs=_net(env)),
+                url=project.url, retries=env.retries,
+                host_jobs=env.host_jobs, name=project.name
+            )
+            local = False
+        if g_pull is None and unreachable:
+            # rejections (e.g. diverged history) are not overridden
+            local = True
+            for source in local_sources(project.url, project.name,
+                                        drop_dir=env.drop_dir,
+                                        url_rewrite=env.url_rewrite):
+                g_pull = git_pull_from(clone_dir=code_path, source=source)
+                if g_pull is not None:
+                    if env.verbose:
+                        print(f'{project.name} fetched from {source}',
+                              mark='pull')
+                    break
+        if g_pull is not None:
+            tally(env.share_dir, 'fetch', shared)
+            if not shared:
+                record(env.share_dir, 'fetch', share, json.dumps(
+                    {'source': str(code_path), 'local': local}
+                ))
     if g_pull is not None:
         # STDERR from pull was blank
         tag = project.tag & (0xff - ACTION_TAG['pull'])
-        if 'Already up to date' in g_pull:
+        moved = head != git_head(clone_dir=code_path)
+        new_modules = _gitmodules(code_path)
+        changed = moved or modules != new_modules
+        pending = _pending_submodules(env, project)
+        if local:
+            if new_modules is not None and (changed or pending.is_file()):
+                print(f'Submodules of {project.name} were not updated',
+                      mark='warn')
+        elif (modules is not None or new_modules is not None) and\
+                (changed or pending.is_file()):
+            # superproject moved (or an earlier update of submodules failed)
+            before = None if changed\
+                else git_submodule_status(clone_dir=code_path)
+            if retry(lambda: git_submodule_update(
+                    clone_dir=code_path, jobs=env.jobs, prockwargs=_net(env)
+            ), url=project.url, retries=env.retries, host_jobs=env.host_jobs,
+                     name=project.name)[0] is None:
+                pending.parent.mkdir(parents=True, exist_ok=True)
+                pending.touch()
+                print(f'Failed Updating submodules of {project.name}',
+                      mark='fpull')
+                return project.key, project.tag, RET_CODE['fail']
+            if pending.is_file():
+                pending.unlink()
+            # only checked out commits of submodules call for installation
+            moved = changed or\
+                git_submodule_status(clone_dir=code_path) != before
+        if 'Already up to date' in g_pull and not moved:
             # Up to date
             if env.verbose:
                 print(f'{project.name} is up to date.', mark='pull')
-            return project.name, tag, RET_CODE['asis']
-        if 'Updating ' in g_pull:
+            return project.key, tag, RET_CODE['asis']
+        if moved or 'Updating ' in g_pull:
             # STDOUT mentioned that the project was updated in some way
             tag |= ACTION_TAG['install']
             if env.verbose:
                 print(f'{project.name} was updated.', mark='pull')
-            return project.name, tag, RET_CODE['pass']
+            return project.key, tag, RET_CODE['pass']
     print(f'Failed Updating code for {project.name}', mark='fpull')
-    return project.name, project.tag, RET_CODE['fail']
+    return project.key, project.tag, RET_CODE['fail']
+
+
+def _build(env: InstallEnv, project: GitProject, i_type: str,
+           code_path: Path, limits: typing.Dict[str, int]
+           ) -> typing.Tuple[bool, typing.List[str], bool]:
+    '''
+    Build and install project in prefix
+
+    Args:
+        env: installation context
+        project: project to install
+        i_type: installation method
+        code_path: path to project's source code
+        limits: resource limits of installation steps
+
+    Returns:
+        success, installed files (relative to prefix),
+        whether those are all the files of the installation
+    '''
+    build_dir = env.prefix.joinpath('incr_build', project.name)\
+        if env.incremental else None
+    with staging(env.prefix, project.name) if env.staged\
+            else contextlib.nullcontext() as stage:
+        with capture(env.prefix, exclude=_scratch(env)) as captured:
+            success = run_install(
+                i_type=i_type, code_path=code_path, prefix=env.prefix,
+                argv=project.inst_argv,
+                env={**stage_env(stage), **project.sh_env}, stage=stage,
+                build_dir=build_dir, launcher=env.compiler_cache,
+                jobs=env.jobs, timeout=project.timeout, limits=limits,
+                logs=log_dir(env.clone_dir, project.name)
+            )
+        # files put in prefix directly (ignoring DESTDIR)
+        installed = captured.files
+        if success and stage is not None:
+            merged = merge(stage, env.prefix, env.clone_dir, project.name,
+                           source=code_path, extra=installed)
+            success = merged is not None
+            installed = installed + (merged or [])
+        elif success:
+            record_install(env.clone_dir, project.name, env.prefix,
+                           installed, source=code_path)
+        if success and captured.shared and env.verbose:
+            print(f'{len(captured.shared)} file(s) of {project.name}'
+                  + ' are not recorded: another installation wrote'
+                  + ' in the prefix meanwhile', mark='info')
+    # staged files are exact, even if some direct writes were set aside
+    return success, installed, stage is not None or not captured.shared
 
 
 def install(
         args: typing.Tuple[InstallEnv, GitProject]
-) -> typing.Tuple[str, int, int]:
+) -> typing.Tuple[str, int, int, typing.Dict[str, typing.Any]]:
     '''
     Install (update) from source code.
 
@@ -194,41 +495,158 @@ def install(
             * project: project to delete
 
     Returns:
-        project.name, project.tag, success code of action
+        project.key, project.tag, success code of action,
+        detected installation method to cache on project
     '''
     env, project = args
     if not (project.tag & ACTION_TAG['install']) or project.pull:
         tag = project.tag & (0xff - ACTION_TAG['install'])
         if env.verbose:
             print(f'Not trying to install {project.name}', mark='bug')
-        return project.name, tag, RET_CODE['asis']
+        return project.key, tag, RET_CODE['asis'], {}
     code_path = Path(env.clone_dir).joinpath(project.name)
-    i_type = None
-    for method_name, method in INST_METHODS.items():
-        if (any(code_path.joinpath(id_file).exists()
-                for id_file in method.instruct.indicate) and not
-            any(code_path.joinpath(xd_file).exists()
-                for xd_file in method.instruct.exdicate)):
-            i_type = method_name
-            break
+    i_type, fingerprint = _detect(code_path, project)
+    detected = {'i_type': i_type, 'fingerprint': fingerprint}
+    limits = _limits(project)
+    if limits is None:
+        return project.key, project.tag, RET_CODE['fail'], detected
     if i_type is not None:
-        success = run_install(i_type=i_type, code_path=code_path,
-                              prefix=env.prefix, argv=project.inst_argv,
-                              env=project.sh_env)
+        instruct = INST_METHODS[i_type].instruct
+        # relocatable files are keyed regardless of the prefix
+        key_prefix = None if instruct.relocatable else env.prefix
+        key = None
+        if env.artifact_cache:
+            key = artifact_key(code_path, i_type, instruct.__dict__,
+                               project=project, prefix=key_prefix)
+        share = None
+        if env.share_dir is not None and instruct.relocatable:
+            # the same build, installed in another group in this run
+            share = key or artifact_key(code_path, i_type, instruct.__dict__,
+                                        project=project, prefix=None)
+        with claim(env.share_dir, 'build', share) as peer:
+            restored = None
+            if peer is not None:
+                restored = restore(share, env.prefix, cache=Path(peer))
+            shared = restored is not None
+            if share is not None:
+                tally(env.share_dir, 'build', shared)
+            if restored is None and key is not None:
+                restored = restore(key, env.prefix)
+                if restored is not None:
+                    record(env.share_dir, 'build', share, str(artifact_dir()))
+            if restored is not None:
+                record_install(env.clone_dir, project.name, env.prefix,
+                               restored, source=code_path)
+                if env.verbose:
+                    source = 'the build of another group' if shared\
+                        else 'artifact cache'
+                    print(f'Restored {project.name} from {source}.',
+                          mark='install')
+                return project.key,\
+                    project.tag & (0xff - ACTION_TAG['install']),\
+                    RET_CODE['pass'], detected
+            success, installed, complete = _build(env, project, i_type,
+                                                  code_path, limits)
+            if success and complete:
+                if key is not None:
+                    if store(key, env.prefix, installed):
+                        record(env.share_dir, 'build', share,
+                               str(artifact_dir()))
+                elif share is not None:
+                    if store(share, env.prefix, installed,
+                             cache=Path(env.share_dir)):
+                        record(env.share_dir, 'build', share, env.share_dir)
         if success:
             if env.verbose:
                 print(f'Installed (update for) project {project.name}.',
                       mark='install')
-            git_clean(code_path)
-            return project.name, project.tag & (0xff - ACTION_TAG['install']),\
-                RET_CODE['pass']
+            if not env.incremental:
+                git_clean(code_path)
+            return project.key, project.tag & (0xff - ACTION_TAG['install']),\
+                RET_CODE['pass'], detected
     if env.verbose:
         print(f'FAILED Installing (update for) project {project.name}',
               mark='finstall')
+        if log_dir(env.clone_dir, project.name).is_dir():
+            print(f'See: pspman -c {env.clone_dir} log {project.name}',
+                  mark='info')
         if TAG_ACTION[project.tag&0xf0] not in CONFIG.opt_in:
             print(f'PSPMan was initialized only with {CONFIG.opt_in}')
-    git_clean(code_path)
-    return project.name, project.tag, RET_CODE['fail']
+    if not env.incremental:
+        git_clean(code_path)
+    return project.key, project.tag, RET_CODE['fail'], detected
+
+
+def resolve_requirements(env: InstallEnv,
+                         projects: typing.Iterable[GitProject]) -> int:
+    '''
+    Install (upgrade) requirements of pip projects about to be installed
+    in a single resolver call, using the method's shared cache.
+    Their own requirement steps then find them satisfied.
+    If the requirements conflict, they are resolved per project.
+    Requirements are installed like projects (staged, captured)
+    and recorded in the shared manifest ``REQUIREMENTS``.
+
+    Args:
+        env: installation context
+        projects: projects in the install batch
+
+    Returns:
+        Number of projects whose requirements were installed
+    '''
+    req_files: typing.List[str] = []
+    for project in projects:
+        if not (project.tag & ACTION_TAG['install']) or project.pull:
+            continue
+        code_path = Path(env.clone_dir).joinpath(project.name)
+        requirements = code_path.joinpath('requirements.txt')
+        if _detect(code_path, project)[0] == 'pip' and requirements.is_file():
+            req_files.append(str(requirements))
+    if not req_files:
+        return 0
+    logs = log_dir(env.clone_dir, REQUIREMENTS)
+    clear_logs(logs, 'batch')
+    resolved = 0
+    # the method's cache, not an inherited one
+    pip_env = {**os.environ, 'PIP_CACHE_DIR': str(method_cache('pip')),
+               'PIP_DISABLE_PIP_VERSION_CHECK': '1'}
+    with staging(env.prefix, REQUIREMENTS) if env.staged\
+            else contextlib.nullcontext() as stage:
+        # --root (unlike PIP_ROOT) doesn't reach pip's isolated build envs
+        pip = ('python3', '-m', 'pip', 'install', '--prefix',
+               str(env.prefix), '-U') + (() if stage is None
+                                         else ('--root', str(stage)))
+        with capture(env.prefix, exclude=_scratch(env)) as captured:
+            if process_comm(
+                    *pip, *(arg for req in req_files for arg in ('-r', req)),
+                    p_name='requirements', fail_handle='report', env=pip_env,
+                    log=step_log(logs, 'batch', 0, 'pip')
+            ) is not None:
+                resolved = len(req_files)
+            else:
+                print('Requirements of pip projects conflict,'
+                      + ' resolving them per project', mark='warn')
+                for idx, req in enumerate(req_files):
+                    if process_comm(*pip, '-r', req, p_name='requirements',
+                                    fail_handle='report', env=pip_env,
+                                    log=step_log(logs, 'batch', idx + 1,
+                                                 'pip')) is not None:
+                        resolved += 1
+        if stage is not None:
+            if merge(stage, env.prefix, env.clone_dir, REQUIREMENTS,
+                     extra=captured.files) is None:
+                resolved = 0
+        else:
+            write_manifest(env.clone_dir, REQUIREMENTS, env.prefix,
+                           captured.files)
+        if captured.shared and env.verbose:
+            print(f'{len(captured.shared)} file(s) of requirements'
+                  + ' are not recorded: another installation wrote'
+                  + ' in the prefix meanwhile', mark='info')
+    if resolved and env.verbose:
+        print(f'Requirements of {resolved} project(s) installed',
+              mark='install')
+    return resolved
 
 
 def success(
@@ -243,7 +661,7 @@ def success(
             * project: project to delete
 
     Returns:
-        project.name, project.tag, ``RET_CODE``[``pass``]
+        project.key, project.tag, ``RET_CODE``[``pass``]
 
     '''
     env, project = args
@@ -251,7 +669,7 @@ def success(
         return 'None', 0x00, RET_CODE['asis']
     project.mark_update_time()
     print(f'{project.name} modified', mark='info')
-    return project.name, project.tag, RET_CODE['pass']
+    return project.key, project.tag, RET_CODE['pass']
 
 
 def failure(
@@ -266,7 +684,7 @@ def failure(
             * project: project to delete
 
     Returns:
-        project.name, project.tag, ``RET_CODE``[``fail``]
+        project.key, project.tag, ``RET_CODE``[``fail``]
     '''
     env, project = args
     if project.tag & ACTION_TAG['install']:
@@ -280,4 +698,4 @@ def failure(
         print("Failed", project.name, mark='fpull')
     elif project.tag & ACTION_TAG['delete']:
         print("Failed", project.name, mark='fdelete')
-    return project.name, project.tag, RET_CODE['fail']
+    return project.key, project.tag, RET_CODE['fail']
@@ -28,6 +28,15 @@ Variables:
     library: str: include libraries -L
     include: str: include libraries -I
     argv: list: argv to be passed during installation
+    root: list: pip's ``--root`` staging root [blank if not staged]
+    launcher: str: compiler cache (ccache, sccache) [blank if disabled]
+    cc: str: C compiler prefixed by launcher [blank if disabled]
+    cxx: str: C++ compiler prefixed by launcher [blank if disabled]
+    jobs: str: parallel build jobs allotted to the installation
+    cache_dir: str: cache directory of the method, shared across projects
+
+Variables in ``env`` must be the complete value.
+``env`` variables that resolve to blank are not set.
 
 Sequence of commands called:
     Installation: prefare, build, compile, install, whichever is not ``null``
@@ -37,13 +46,20 @@ Sequence of commands called:
 
 
 import os
+import re
+import shlex
+import pickle
 import shutil
+import tempfile
+from collections.abc import Mapping
 from pathlib import Path
 import yaml
 import typing
 from pspman.errors import (InstructError, InstructFmtError,
                            InstructTypeError, MissingInstructError)
-from pspman.shell import process_comm
+from pspman.shell import process_comm, parse_limits, RLIMITS
+from pspman.compiler_cache import cache_env
+from pspman.logs import clear_logs, step_log
 from pspman import CONFIG
 
 
@@ -61,6 +77,10 @@ class Instruct():
 
             * steps: strings that may start with a caret sign (^)
               ^ indicates that this step is allowed to fail
+        timeout: wall-clock seconds allowed to each step
+        limits: resource limits (``shell.RLIMITS``) of each step
+        relocatable: installed files don't depend on the prefix,
+            they may be copied to another prefix
 
 
     Args:
@@ -73,6 +93,9 @@ class Instruct():
         self.env: typing.Dict[str, str] = {}
         self.install: typing.List[str] = []
         self.uninstall: typing.List[str] = []
+        self.timeout: typing.Optional[float] = None
+        self.limits: typing.Dict[str, int] = {}
+        self.relocatable: bool = False
         if instruct_file:
             self.read(instruct_file)
 
@@ -123,6 +146,23 @@ class Instruct():
         self.uninstall = instruct.get('uninstall') or []
         if not isinstance(self.uninstall, list):
             raise InstructTypeError('uninstall', type(self.uninstall), 'list')
+        self.timeout = instruct.get('timeout')
+        if self.timeout is not None and (
+                isinstance(self.timeout, bool)
+                or not isinstance(self.timeout, (int, float))):
+            raise InstructTypeError('timeout', type(self.timeout), 'number')
+        limits = instruct.get('limits') or {}
+        if not isinstance(limits, dict):
+            raise InstructTypeError('limits', type(limits), 'dict')
+        try:
+            self.limits = parse_limits(limits)
+        except ValueError as err:
+            raise InstructTypeError('limits', type(limits),
+                                    f'sizes of {"/".join(RLIMITS)}') from err
+        self.relocatable = instruct.get('relocatable', False)
+        if not isinstance(self.relocatable, bool):
+            raise InstructTypeError('relocatable', type(self.relocatable),
+                                    'bool')
 
         # parse install
         for ids, step in enumerate(self.install):
@@ -130,6 +170,170 @@ class Instruct():
                 raise InstructTypeError(f'step {ids}', type(step), 'str')
 
 
+SCALAR_VARS: typing.Tuple[str, ...] = ('code_path', 'prefix', 'build_dir',
+                                      'launcher', 'cc', 'cxx', 'jobs',
+                                      'cache_dir')
+'''
+Variables that are substituted within an argument
+'''
+
+TUPLE_VARS: typing.Tuple[str, ...] = ('argv', 'library', 'include', 'root')
+'''
+Variables that are expanded into (zero or more) whole arguments
+'''
+
+_SLOT = re.compile('__(' + '|'.join(SCALAR_VARS) + ')__')
+_TUPLE = re.compile('__(' + '|'.join(TUPLE_VARS) + ')__')
+
+
+class InstructStep():
+    '''
+    Step of installation, compiled once from an instruction string:
+    shell-like tokens with typed slots for variables, and the step's
+    environment split into fixed values and variable slots.
+    Binding a project only fills the slots.
+
+    Args:
+        action: instruction string, optionally prefixed by ``^``
+        env: environment variables of instructions
+        timeout: wall-clock seconds allowed to the step
+        limits: resource limits of the step
+
+    Attributes:
+        optional: step is allowed to fail
+        tokens: each argument as
+
+            * str: fixed argument
+            * (str,): tuple variable, expanded into arguments
+            * List[str]: alternating fixed text and scalar variable names
+        env_fixed: fixed environment variables
+        env_slots: environment variable: scalar variable name
+        timeout: wall-clock seconds allowed to the step
+        limits: resource limits of the step
+        command: name of the command called by the step (for logs)
+
+    '''
+    def __init__(self, action: str, env: typing.Dict[str, str] = None,
+                 timeout: float = None, limits: typing.Dict[str, int] = None):
+        self.optional = action.startswith('^')
+        self.timeout = timeout
+        self.limits = limits or {}
+        self.tokens: typing.List[typing.Union[str, typing.Tuple[str],
+                                              typing.List[str]]] = []
+        for token in shlex.split(action.lstrip('^')):
+            tuple_var = _TUPLE.fullmatch(token)
+            if tuple_var is not None:
+                self.tokens.append((tuple_var.group(1),))
+                continue
+            parts = _SLOT.split(token)
+            self.tokens.append(parts if len(parts) > 1 else token)
+        # e.g. __code_path__/configure: configure
+        first = self.tokens[0] if self.tokens else ()
+        if isinstance(first, list):
+            first = first[-1]
+        self.command = Path(first).name if isinstance(first, str) else ''
+        self.command = self.command or 'step'
+        self.env_fixed: typing.Dict[str, str] = {}
+        self.env_slots: typing.Dict[str, str] = {}
+        for key, val in (env or {}).items():
+            slot = _SLOT.fullmatch(str(val))
+            if slot is None:
+                self.env_fixed[key] = str(val)
+            else:
+                self.env_slots[key] = slot.group(1)
+
+    def bind(self, scalars: typing.Dict[str, str],
+             tuples: typing.Dict[str, typing.Sequence[str]]
+             ) -> typing.List[str]:
+        '''
+        Fill slots to get the command
+
+        Args:
+            scalars: values of ``SCALAR_VARS``
+            tuples: values of ``TUPLE_VARS``
+
+        Returns:
+            command arguments
+        '''
+        cmd: typing.List[str] = []
+        for token in self.tokens:
+            if isinstance(token, str):
+                cmd.append(token)
+            elif isinstance(token, tuple):
+                cmd.extend(tuples.get(token[0]) or ())
+            else:
+                # odd positions are variable names
+                arg = ''.join(scalars.get(part, '') if idx % 2 else part
+                              for idx, part in enumerate(token))
+                if arg or any(token[::2]):
+                    # only a blank variable, without text, is dropped
+                    cmd.append(arg)
+        return cmd
+
+    def __call__(self, code_path: Path, prefix: Path, build_dir: Path,
+                 env: typing.Dict[str, str] = None,
+                 argv: typing.Tuple[str, ...] = None,
+                 launcher: str = None, jobs: int = 1, timeout: float = None,
+                 limits: typing.Dict[str, int] = None,
+                 log: Path = None, cache_dir: Path = None,
+                 override: typing.Dict[str, str] = None,
+                 stage: Path = None) -> bool:
+        '''
+        Run the step
+
+        Args:
+            code_path: path to source code
+            prefix: installtion prefix
+            build_dir: build_directory
+            env: inherited env during installation, takes precedence over
+                the step's env, except variables bound to ``__cache_dir__``
+            argv: arguments to be supplied during installation
+            launcher: compiler cache that launches compilers
+            jobs: parallel build jobs allotted
+            timeout: overrides the step's timeout
+            limits: override the step's resource limits
+            log: stream output of the step to this file
+            cache_dir: cache directory of the installation method
+            override: custom env of the project, takes precedence over all
+            stage: staging root of the installation, ``None``: not staged
+
+        Returns:
+            success of step (``True`` if step is optional)
+
+        '''
+        scalars = {'code_path': str(code_path),
+                   'prefix': str(prefix),
+                   'build_dir': str(build_dir),
+                   'launcher': launcher or '',
+                   'cc': f'{launcher} cc' if launcher else '',
+                   'cxx': f'{launcher} c++' if launcher else '',
+                   'jobs': str(jobs),
+                   'cache_dir': str(cache_dir or '')}
+        inc = prefix.joinpath('include')
+        lib = prefix.joinpath('lib')
+        tuples = {'argv': argv or (),
+                  'include': ("-I", str(inc)) if inc.is_dir() else (),
+                  'library': ("-L", str(lib)) if lib.is_dir() else (),
+                  'root': ("--root", str(stage)) if stage else ()}
+        step_env = self.env_fixed.copy()
+        for key, slot in self.env_slots.items():
+            if scalars[slot]:
+                # blank values are not set
+                step_env[key] = scalars[slot]
+        step_env.update(env or {})
+        for key, slot in self.env_slots.items():
+            if slot == 'cache_dir' and scalars[slot]:
+                # pspman's cache of the method, not an inherited one
+                step_env[key] = scalars[slot]
+        step_env.update(override or {})
+        step_success = process_comm(
+            *self.bind(scalars, tuples), env=step_env, fail_handle='report',
+            timeout=self.timeout if timeout is None else timeout,
+            limits={**self.limits, **(limits or {})}, log=log
+        )
+        return self.optional or bool(step_success)
+
+
 class DefInstruct():
     '''
     Instructions definition class
@@ -151,6 +355,8 @@ class DefInstruct():
             * compile: compilation function
             * install: install function
             * uninstall: uninstall function
+        i_steps: List[InstructStep]: compiled installation steps
+        u_steps: List[InstructStep]: compiled uninstallation steps
 
     Args:
         instruct_file: yaml file describing instructions
@@ -163,104 +369,35 @@ class DefInstruct():
     def __init__(self, instruct_file: Path):
         self.type = Path(instruct_file).name
         self.instruct = Instruct(instruct_file)
-        self.i_steps: typing.List[typing.Callable] = []
-        self.u_steps: typing.List[typing.Callable] = []
+        self.i_steps: typing.List[InstructStep] = []
+        self.u_steps: typing.List[InstructStep] = []
         for action in self.instruct.install:
             self.i_steps.append(self.instruct_def(action=action))
 
         for action in self.instruct.uninstall:
             self.u_steps.append(self.instruct_def(action=action))
 
-    @staticmethod
-    def _parse_i(instr: str = None,
-                 argv: typing.Tuple[str, ...] = None,
-                 libs: typing.Tuple[str, ...] = None,
-                 incl: typing.Tuple[str, ...] = None) -> typing.List[str]:
+    def instruct_def(self, action: str) -> 'InstructStep':
         '''
-        parse instruction string instr
+        Compile a step (callable) from an ``instructions`` action
 
         Args:
-            instr: instruction string
+            action: instruction string
 
         Returns:
-            List of string separated by " "
-        '''
-        tuple_vars = {"__argv__": argv or (),
-                      "__library__": libs or (),
-                      "__include__": incl or ()}
-        if instr is None:
-            return []
-        while "  " in instr:
-            instr = instr.replace("  ", " ")
-        cmd = instr.split(" ")
-        for var, args in tuple_vars.items():
-            if var not in cmd:
-                continue
-            var_idx = cmd.index(var)
-            cmd.pop(var_idx)
-            for element in args[::-1]:
-                cmd.insert(var_idx, element)
-        return cmd
-
-    def instruct_def(self, action: str) -> typing.Callable:
+            Installation step constructed from action
         '''
-        Generate a ``def`` (function) given an ``instructions`` Object
+        return InstructStep(action, env=self.instruct.env,
+                            timeout=self.instruct.timeout,
+                            limits=self.instruct.limits)
 
-        Args:
-            instructions
 
-        Returns:
-            Installation function constructed from action
-        '''
-        def act_f(code_path: Path,
-                  prefix: Path,
-                  build_dir: Path,
-                  env: typing.Dict[str, str] = None,
-                  argv: typing.Tuple[str, ...] = None) -> bool:
-            '''
-            function to prepare based on instructions
-
-            Args:
-                code_path: path to source code
-                prefix: installtion prefix
-                build_dir: build_directory
-                env: custom env during installation
-                argv: arguments to be supplied during installation
-
-            Returns:
-                success of compilation
-
-            '''
-            i_var_vals = {'__code_path__': str(code_path),
-                          '__prefix__': str(prefix),
-                          '__build_dir__': str(build_dir)}
-            env = env or {}
-            argv = argv or ()
-            inc = prefix.joinpath('include')
-            lib = prefix.joinpath('lib')
-            incl = ("-I", str(inc)) if inc.is_dir() else ()
-            libs = ("-L", str(lib)) if lib.is_dir() else ()
-            env = {**self.instruct.env, **env}
-            act_i = action
-            ret_code = True if act_i[0] == '^' else False
-            act_i = act_i.strip('^')
-            for ivar, ival in i_var_vals.items():
-                act_i = act_i.replace(ivar, ival)
-                for key, val in env.items():
-                    if val == ivar:
-                        env[key] = ival
-            comm = self._parse_i(instr=act_i, argv=argv, libs=libs, incl=incl)
-            step_success = process_comm(*comm, env=env, fail_handle='report')
-            return ret_code or bool(step_success)
-        return act_f
-
-
-def get_instruct(config: Path = None) -> typing.Dict[str, DefInstruct]:
+def _instruct_files(config: Path = None) -> typing.List[Path]:
     '''
-    Scan standard locations for instruction files
+    Instruction files in standard locations, in order of loading
 
     Args:
-        custom_path: Scan this too
+        config: Scan this too
     '''
     standard_paths: typing.List[Path] = [
         Path(__file__).parent.joinpath('inst_config').resolve()
@@ -268,17 +405,118 @@ def get_instruct(config: Path = None) -> typing.Dict[str, DefInstruct]:
     if config is not None:
         if config.is_dir():
             standard_paths.append(config.resolve())
-    known_types: typing.Dict[str, DefInstruct] = {}
-    for inst_path in standard_paths:
-        for node in inst_path.iterdir():
+    return [node for inst_path in standard_paths
+            for node in inst_path.iterdir()
             if all((node.is_file(),
                     node.stem != 'template',
-                    node.suffix == '.yml')):
-                known_types[node.stem] = DefInstruct(node)
+                    node.suffix == '.yml'))]
+
+
+def _stamp(files: typing.List[Path]) -> typing.List[typing.Tuple[str, int,
+                                                                  int]]:
+    '''
+    Path, mtime and size of instruction files and of this module,
+    which determine the parsed instructions
+    '''
+    stamp = []
+    for node in [Path(__file__)] + files:
+        stat = node.stat()
+        stamp.append((str(node), stat.st_mtime_ns, stat.st_size))
+    return stamp
+
+
+def get_instruct(config: Path = None,
+                 cache: Path = None) -> typing.Dict[str, DefInstruct]:
+    '''
+    Scan standard locations for instruction files
+
+    Args:
+        config: Scan this too
+        cache: pickle of parsed instructions, used while the files
+            (and this module) are unchanged; updated otherwise
+    '''
+    files = _instruct_files(config)
+    stamp = _stamp(files)
+    if cache is not None and cache.is_file():
+        try:
+            with open(cache, 'rb') as cache_h:
+                cached = pickle.load(cache_h)
+            if cached['stamp'] == stamp:
+                return cached['methods']
+        except Exception:
+            # stale or corrupt: parse again
+            pass
+    known_types: typing.Dict[str, DefInstruct] = {}
+    for node in files:
+        known_types[node.stem] = DefInstruct(node)
+    if cache is not None:
+        part = cache.with_name(f'.{cache.name}.{os.getpid()}')
+        try:
+            cache.parent.mkdir(parents=True, exist_ok=True)
+            with open(part, 'wb') as cache_h:
+                pickle.dump({'stamp': stamp, 'methods': known_types},
+                            cache_h)
+            os.replace(part, cache)
+        except OSError:
+            if part.exists():
+                part.unlink()
     return known_types
 
 
-INST_METHODS = get_instruct(config=CONFIG.config_dir.joinpath('inst_config'))
+class InstMethods(Mapping):
+    '''
+    Methods of installation, loaded (by ``get_instruct``) on first use
+
+    Args:
+        config: user's directory of instruction files
+        cache: pickle of parsed instructions
+    '''
+    def __init__(self, config: Path = None, cache: Path = None):
+        self.config = config
+        self.cache = cache
+        self._methods: typing.Optional[typing.Dict[str, DefInstruct]] = None
+        self._stamp: typing.Optional[typing.List[typing.Tuple[str, int,
+                                                              int]]] = None
+
+    def load(self) -> typing.Dict[str, DefInstruct]:
+        '''
+        Load methods, unless already loaded
+
+        Returns:
+            methods
+        '''
+        if self._methods is None:
+            self._methods = get_instruct(config=self.config, cache=self.cache)
+        return self._methods
+
+    def refresh(self) -> typing.Dict[str, DefInstruct]:
+        '''
+        Load methods again if instruction files changed since they were
+        loaded (by refresh), for long-lived processes
+
+        Returns:
+            methods
+        '''
+        stamp = _stamp(_instruct_files(self.config))
+        if self._methods is None or stamp != self._stamp:
+            self._methods = get_instruct(config=self.config, cache=self.cache)
+            self._stamp = stamp
+        return self._methods
+
+    def __getitem__(self, i_type: str) -> DefInstruct:
+        return self.load()[i_type]
+
+    def __iter__(self) -> typing.Iterator[str]:
+        return iter(self.load())
+
+    def __len__(self) -> int:
+        return len(self.load())
+
+
+INST_METHODS = InstMethods(
+    config=CONFIG.config_dir.joinpath('inst_config'),
+    cache=CONFIG.data_dir.joinpath('cache', 'inst_config.pickle')
+)
 '''
 Methods of installation and uninstallation defined from instructions
 Default: make, cmake, pip, meson/ninja
@@ -287,11 +525,30 @@ Extended for <instruct> by creating <config_dir>/inst_config/<instruct>.yml
 '''
 
 
+def method_cache(i_type: str) -> Path:
+    '''
+    Cache directory of an installation method (``__cache_dir__``),
+    shared by its installations across projects and runs
+
+    Args:
+        i_type: installation method
+
+    '''
+    return CONFIG.data_dir.joinpath('cache', i_type)
+
+
 def run_install(i_type: str,
                 code_path: Path,
                 prefix=Path,
                 argv: typing.List[str] = None,
-                env: typing.Dict[str, str] = None) -> bool:
+                env: typing.Dict[str, str] = None,
+                build_dir: Path = None,
+                launcher: str = None,
+                jobs: int = 1,
+                timeout: float = None,
+                limits: typing.Dict[str, int] = None,
+                logs: Path = None,
+                stage: Path = None) -> bool:
     '''
     (un)Install repository
 
@@ -300,6 +557,19 @@ def run_install(i_type: str,
         prefix: ``--prefix`` flag value to be supplied
         argv: Arguments to be supplied during (un)installation
         env: Modifications in shell env variables during (un)installation
+        build_dir: persistent build directory, retained after installation.
+            If ``None``, a private temporary build directory is created
+            under ``prefix/temp_build/<i_type>`` and removed after use.
+        launcher: compiler cache that launches compilers, ``None``: disabled
+        jobs: parallel build jobs allotted by the scheduler, also exported
+            as ``MAKEFLAGS`` and ``CMAKE_BUILD_PARALLEL_LEVEL``
+            unless those are already set
+        timeout: wall-clock seconds allowed to each step,
+            ``None``: as instructed
+        limits: resource limits of each step, override instructed limits
+        logs: directory to hold logs of steps (see ``logs``),
+            replacing logs of the previous (un)installation
+        stage: staging root (see ``staging``), ``None``: not staged
 
     Returns:
         ``False`` if error/failure during (un)installation, else, ``True``
@@ -314,21 +584,45 @@ def run_install(i_type: str,
     argv = argv or []
     env = env or {}
     mod_env = os.environ.copy()
-    for var, val in env.items():
-        mod_env[var] = val
-    build_dir = prefix.joinpath('temp_build', i_type)
-    build_dir.mkdir(parents=True, exist_ok=True)
+    mod_env.update(cache_env(launcher))
+    mod_env.setdefault('MAKEFLAGS', f'-j{jobs}')
+    mod_env.setdefault('CMAKE_BUILD_PARALLEL_LEVEL', str(jobs))
+    persist = build_dir is not None
+    if persist:
+        build_dir.mkdir(parents=True, exist_ok=True)
+    else:
+        # unique to this invocation: parallel builds never share it
+        temp_build = prefix.joinpath('temp_build', i_type)
+        temp_build.mkdir(parents=True, exist_ok=True)
+        build_dir = Path(tempfile.mkdtemp(prefix=f'{code_path.name}.',
+                                          dir=temp_build))
     steps = INST_METHODS[i_type].u_steps if uninstall \
         else INST_METHODS[i_type].i_steps
-    for action in steps:
-        if not action(
-                code_path=code_path,
-                prefix=prefix,
-                env=mod_env,
-                argv=argv,
-                build_dir=build_dir
-        ):
-            shutil.rmtree(build_dir)
-            return False
-    shutil.rmtree(build_dir)
-    return True
+    action_name = 'uninstall' if uninstall else 'install'
+    if logs is not None:
+        clear_logs(logs, action_name)
+    success = True
+    try:
+        for index, action in enumerate(steps):
+            if not action(
+                    code_path=code_path,
+                    prefix=prefix,
+                    env=mod_env,
+                    argv=argv,
+                    build_dir=build_dir,
+                    launcher=launcher,
+                    jobs=jobs,
+                    timeout=timeout,
+                    limits=limits,
+                    log=None if logs is None else step_log(
+                        logs, action_name, index, action.command),
+                    cache_dir=method_cache(i_type),
+                    override=env,
+                    stage=stage
+            ):
+                success = False
+                break
+    finally:
+        if not persist:
+            shutil.rmtree(build_dir, ignore_errors=True)
+    return success
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8; mode:python -*-
+#
+# Copyright 2020 Pradyumna Paranjape
+# This file is part of pspman.
+#
+# pspman is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pspman is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with pspman.  If not, see <https://www.gnu.org/licenses/>.
+#
+'''
+Logs of installation steps
+
+Output (stdout and stderr, interleaved) of each (un)installation step
+is streamed to clone_dir/.pspman.logs/<project>/<action>.<NN>.<command>.log.gz.
+Logs of a project's previous installation (or uninstallation) are replaced.
+Only a bounded tail of the output is held in memory, for error reports.
+
+'''
+
+
+import sys
+import gzip
+import typing
+import threading
+import subprocess
+import collections
+from pathlib import Path
+from . import print
+
+
+TAIL_LINES = 40
+'''
+Lines of output retained in memory for error reports
+'''
+
+
+def log_dir(clone_dir: Path, name: str) -> Path:
+    '''
+    Directory that holds logs of project
+
+    Args:
+        clone_dir: directory in which, project is cloned
+        name: name of project
+
+    '''
+    return Path(clone_dir).joinpath('.pspman.logs', name)
+
+
+def step_log(logs: Path, action: str, index: int, command: str) -> Path:
+    '''
+    Log file of a step
+
+    Args:
+        logs: directory that holds logs of project
+        action: install, uninstall
+        index: serial number of step
+        command: command called by the step
+
+    '''
+    return logs.joinpath(f'{action}.{index:02d}.{command}.log.gz')
+
+
+def clear_logs(logs: Path, action: str):
+    '''
+    Remove logs of previous action
+
+    Args:
+        logs: directory that holds logs of project
+        action: install, uninstall
+
+    '''
+    if logs.is_dir():
+        for old in logs.glob(f'{action}.*.log.gz'):
+            old.unlink()
+
+
+def stream_log(process: subprocess.Popen, log: Path, timeout: float = None,
+               kill: typing.Callable[[subprocess.Popen], None] = None) -> str:
+    '''
+    Write output of process to log as it is produced, wait for process
+
+    Args:
+        process: process whose ``stdout`` is a (text) pipe
+        log: log file
+        timeout: seconds after which, process is killed
+        kill: function that kills process [default: ``Popen.kill``]
+
+    Returns:
+        last ``TAIL_LINES`` lines of output
+    '''
+    tail: typing.Deque[str] = collections.deque(maxlen=TAIL_LINES)
+    expired: typing.List[bool] = []
+    kill = kill or subprocess.Popen.kill
+
+    def expire():
+        expired.append(True)
+        kill(process)
+
+    timer = None
+    if timeout is not None:
+        timer = threading.Timer(timeout, expire)
+        timer.daemon = True
+        timer.start()
+    log.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        with gzip.open(log, 'wt') as log_h:
+            for line in process.stdout:
+                log_h.write(line)
+                tail.append(line)
+            process.wait()
+            if expired:
+                tail.append(f'killed after {timeout} seconds\n')
+                log_h.write(tail[-1])
+    finally:
+        if timer is not None:
+            timer.cancel()
+    return ''.join(tail)
+
+
+def print_log(clone_dir: Path, name: str, step: str = None) -> int:
+    '''
+    Print logs of project's last (un)installation
+
+    Args:
+        clone_dir: directory in which, project is cloned
+        name: name of project
+        step: print only steps whose action, serial number or command
+            is ``step``
+
+    Returns:
+        Error code: ``1`` if no log was found
+    '''
+    logs = sorted(log_dir(clone_dir, name).glob('*.log.gz'))
+    if step is not None:
+        # action.index.command
+        logs = [log for log in logs
+                if step in log.name[:-len('.log.gz')].split('.', 2)
+                or step.zfill(2) == log.name.split('.', 2)[1]]
+    if not logs:
+        print(f'No logs of {name}' + (f' step {step}' if step else ''),
+              mark='err')
+        return 1
+    for log in logs:
+        print(log.name[:-len('.log.gz')], mark='info')
+        with gzip.open(log, 'rt', errors='replace') as log_h:
+            for line in log_h:
+                sys.stdout.write(line)
+    return 0
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8; mode:python -*-
+#
+# Copyright 2020 Pradyumna Paranjape
+# This file is part of pspman.
+#
+# pspman is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pspman is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with pspman.  If not, see <https://www.gnu.org/licenses/>.
+#
+'''
+Install manifests: files that each project put in the prefix
+
+Manifests are stored as clone_dir/.pspman.manifests/<project>,
+one path (relative to prefix) per line.
+Only exact records are kept: files staged for the project,
+or captured files that no other installation could have written.
+
+Python distributions that a project pulled in as dependencies are shared
+by the projects that need them: they are recorded in the manifest
+``.requirements``, and removed with the last project of the group.
+
+A file is removed only by the last manifest that lists it,
+and not if it was modified after the manifest was recorded.
+
+'''
+
+
+import os
+import csv
+import json
+import fcntl
+import typing
+import contextlib
+import urllib.parse
+from pathlib import Path
+from . import print
+
+
+REQUIREMENTS = '.requirements'
+'''
+Manifest of shared dependencies
+'''
+
+
+def manifest_dir(clone_dir: Path) -> Path:
+    '''
+    Directory that holds manifests of projects in clone_dir
+    '''
+    return Path(clone_dir).joinpath('.pspman.manifests')
+
+
+@contextlib.contextmanager
+def _manifest_lock(clone_dir: Path) -> typing.Iterator[None]:
+    '''
+    Serialize updates of manifests (the shared one) among processes
+    '''
+    manifests = manifest_dir(clone_dir)
+    manifests.mkdir(parents=True, exist_ok=True)
+    lock_fd = os.open(manifests.joinpath('.lock'), os.O_RDWR | os.O_CREAT,
+                      0o600)
+    try:
+        fcntl.flock(lock_fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(lock_fd)
+
+
+def project_manifests(clone_dir: Path) -> typing.List[str]:
+    '''
+    Projects in clone_dir whose manifests are recorded
+
+    Args:
+        clone_dir: directory in which, projects are cloned
+
+    Returns:
+        names of projects
+    '''
+    manifests = manifest_dir(clone_dir)
+    if not manifests.is_dir():
+        return []
+    return sorted(entry.name for entry in manifests.iterdir()
+                  if not entry.name.startswith('.'))
+
+
+def read_manifest(clone_dir: Path,
+                  name: str) -> typing.Optional[typing.List[str]]:
+    '''
+    Files installed by project
+
+    Args:
+        clone_dir: directory in which, project is cloned
+        name: name of project
+
+    Returns:
+        relative paths, ``None`` if no manifest was recorded
+    '''
+    manifest = manifest_dir(clone_dir).joinpath(name)
+    if not manifest.is_file():
+        return None
+    return [line for line in manifest.read_text().splitlines() if line]
+
+
+def _write(clone_dir: Path, name: str, prefix: Path,
+           files: typing.Iterable[str]):
+    '''
+    Record files, retaining existing files of the previous manifest
+    '''
+    installed = set(files)
+    installed.update(path for path in read_manifest(clone_dir, name) or []
+                     if os.path.lexists(prefix.joinpath(path)))
+    manifest = manifest_dir(clone_dir).joinpath(name)
+    manifest.parent.mkdir(parents=True, exist_ok=True)
+    part = manifest.with_name(f'.part.{name}.{os.getpid()}')
+    part.write_text(''.join(f'{path}\n' for path in sorted(installed)))
+    os.replace(part, manifest)
+
+
+def write_manifest(clone_dir: Path, name: str, prefix: Path,
+                   files: typing.Iterable[str]):
+    '''
+    Record files installed by project.
+    Files of the previous manifest that still exist are retained:
+    an update doesn't remove files that the new version no longer installs.
+
+    Args:
+        clone_dir: directory in which, project is cloned
+        name: name of project
+        prefix: installation prefix
+        files: relative paths in prefix
+
+    '''
+    with _manifest_lock(clone_dir):
+        _write(clone_dir, name, prefix, files)
+
+
+def _points_to(dist_info: Path, source: Path) -> bool:
+    '''
+    Was the distribution installed from source? (PEP 610)
+    '''
+    try:
+        url = json.loads(dist_info.joinpath('direct_url.json').read_text()
+                         )['url']
+    except (OSError, ValueError, KeyError, TypeError):
+        return False
+    parsed = urllib.parse.urlparse(url)
+    if parsed.scheme != 'file':
+        return False
+    return Path(urllib.parse.unquote(parsed.path)).resolve()\
+        == Path(source).resolve()
+
+
+def dependencies(prefix: Path, files: typing.Iterable[str],
+                 source: Path) -> typing.Set[str]:
+    '''
+    Files of python distributions that were installed along with the
+    project (from source) as its dependencies.
+    Nothing is told apart, unless a distribution is found installed
+    from source.
+
+    Args:
+        prefix: installation prefix
+        files: relative paths in prefix, installed by the project
+        source: path to project's source code
+
+    Returns:
+        relative paths that belong to dependencies
+    '''
+    files = set(files)
+    records = [path for path in files
+               if path.endswith('.dist-info' + os.sep + 'RECORD')]
+    own = False
+    deps: typing.Set[str] = set()
+    for record in records:
+        dist_info = prefix.joinpath(record).parent
+        if _points_to(dist_info, source):
+            own = True
+            continue
+        site_dir = os.path.dirname(os.path.dirname(record))
+        try:
+            with open(prefix.joinpath(record), newline='') as record_fh:
+                for row in csv.reader(record_fh):
+                    if row:
+                        path = os.path.normpath(os.path.join(site_dir,
+                                                             row[0]))
+                        if path in files:
+                            deps.add(path)
+        except OSError:
+            continue
+    return deps if own else set()
+
+
+def record_install(clone_dir: Path, name: str, prefix: Path,
+                   files: typing.Iterable[str], source: Path = None):
+    '''
+    Record files installed by project,
+    its python dependencies in the shared manifest ``REQUIREMENTS``
+
+    Args:
+        clone_dir: directory in which, project is cloned
+        name: name of project
+        prefix: installation prefix
+        files: relative paths in prefix
+        source: path to project's source code, ``None``: not a project
+
+    '''
+    files = list(files)
+    deps = set() if source is None else dependencies(prefix, files, source)
+    with _manifest_lock(clone_dir):
+        if deps:
+            _write(clone_dir, REQUIREMENTS, prefix, deps)
+        _write(clone_dir, name, prefix,
+               (path for path in files if path not in deps))
+
+
+def drop_manifest(clone_dir: Path, name: str):
+    '''
+    Forget files installed by project
+
+    Args:
+        clone_dir: directory in which, project is cloned
+        name: name of project
+
+    '''
+    manifest = manifest_dir(clone_dir).joinpath(name)
+    if manifest.is_file():
+        manifest.unlink()
+
+
+def remove_installed(clone_dir: Path, name: str,
+                     prefix: Path) -> typing.Optional[int]:
+    '''
+    Remove files installed by project that no other manifest lists,
+    and directories that are left empty.
+    Files modified after the manifest was recorded are kept.
+
+    Args:
+        clone_dir: directory in which, project is cloned
+        name: name of project
+        prefix: installation prefix
+
+    Returns:
+        Number of files removed, ``None`` if no manifest was recorded
+
+    Raises:
+        OSError: files couldn't be removed (each is reported);
+            the manifest is kept, so that the removal may be retried
+    '''
+    files = read_manifest(clone_dir, name)
+    if files is None:
+        return None
+    recorded = manifest_dir(clone_dir).joinpath(name).stat().st_mtime_ns
+    shared: typing.Set[str] = set()
+    for other in project_manifests(clone_dir) + [REQUIREMENTS]:
+        if other != name:
+            shared.update(read_manifest(clone_dir, other) or [])
+    removed = 0
+    failed: typing.Optional[OSError] = None
+    parents: typing.Set[Path] = set()
+    for rel_path in files:
+        if rel_path in shared:
+            continue
+        path = prefix.joinpath(rel_path)
+        try:
+            if os.lstat(path).st_mtime_ns > recorded:
+                # not ours anymore
+                continue
+            path.unlink()
+        except FileNotFoundError:
+            continue
+        except OSError as err:
+            print(f'{name}: {path} could not be removed: {err.strerror}',
+                  mark='err')
+            failed = err
+            continue
+        removed += 1
+        parents.update(path.parents)
+    # deepest first; keep prefix's top-level structure (bin, lib, ...)
+    for parent in sorted(parents, key=lambda par: len(par.parts),
+                         reverse=True):
+        if len(parent.parts) <= len(prefix.parts) + 1:
+            continue
+        try:
+            parent.rmdir()
+        except OSError:
+            # not empty
+            pass
+    if failed is not None:
+        raise failed
+    drop_manifest(clone_dir, name)
+    return removed
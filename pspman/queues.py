@@ -37,8 +37,11 @@ import json
 import yaml
 from . import print
 from .classes import InstallEnv, GitProject, GitProjEncoder
-from .fork_actions import delete, clone, update, install, success, failure
+from .fork_actions import (delete, clone, update, install, success, failure,
+                           resolve_requirements)
 from .errors import ClosedQueueError
+from .completion import index_add, index_drop
+from .define import state_lock
 from .tag import TAG_ACTION, RET_CODE
 
 
@@ -49,7 +52,9 @@ class PSPQueue:
 
     Attributes:
         env: installation context
-        queue: queued ``GitProjects``
+        envs: installation contexts of groups, by prefix,
+            when projects of several groups share the queue
+        queue: queued ``GitProjects``, by ``GitProject.key``
         downstream_qs: upstream queues feeding to this queue
             * success: successful projects are pushed here
             * fail: failed projects are pushed here
@@ -67,12 +72,14 @@ class PSPQueue:
         **kwargs:
             * items: Optional[Dict[str, GitProject]]: initialize with items
             * q_type: type of queue
+            * envs: Dict[str, InstallEnv]: installation contexts of groups
 
     '''
     def __init__(self, env: InstallEnv, action: typing.Callable,
                  fail_q: 'PSPQueue' = None,  # type: ignore
                  **kwargs):
         self.env = env
+        self.envs: typing.Dict[str, InstallEnv] = kwargs.get('envs') or {}
         self._parallel = len(os.sched_getaffinity(0))
         self.upstream_qs: typing.List['PSPQueue'] = []  # type: ignore
         self.downstream_qs = {'success': kwargs.get('success'),
@@ -121,6 +128,13 @@ class PSPQueue:
         else:
             raise ClosedQueueError(self)
 
+    def env_of(self, project: GitProject) -> InstallEnv:
+        '''
+        Parent/child: installation context of project's group
+
+        '''
+        return self.envs.get(project.group or '', self.env)
+
     def __len__(self) -> int:
         '''
         Parent/child: length of ojects in the queue
@@ -137,23 +151,30 @@ class PSPQueue:
             return
         while len(self):
             n_wrkrs = min(self._parallel, len(self))
+            # share the stage's budget among workers (of all groups)
+            for env in {self.env, *self.envs.values()}:
+                env.jobs = max(1, self._parallel // n_wrkrs)
             if self.env.verbose:
                 print(f'Spawned {n_wrkrs} {self.q_type} worker(s)', mark='act')
                 print(f'For projects:', mark='act')
                 for p_name in self.queue:
                     print(p_name, mark='list')
             with multiprocessing.Pool(n_wrkrs) as pool:
-                results: typing.List[typing.Tuple[str, int, int]] = list(
+                results: typing.List[typing.Tuple[typing.Any, ...]] = list(
                     pool.map_async(self.action,
-                                   ((self.env, project) for
+                                   ((self.env_of(project), project) for
                                     project in self.queue.values())).get())
-            for res in results:
-                project = self.queue[res[0]]
-                del self.queue[res[0]]
-                project.tag = res[-2]
-                if res[-1] == RET_CODE['pass']:
+            for key, tag, code, *updates in results:
+                project = self.queue[key]
+                del self.queue[key]
+                project.tag = tag
+                for attrs in updates:
+                    # attributes modified by the worker (lost in its copy)
+                    for attr, val in attrs.items():
+                        setattr(project, attr, val)
+                if code == RET_CODE['pass']:
                     self.on_success(project)
-                elif res[-1] == RET_CODE['fail']:
+                elif code == RET_CODE['fail']:
                     self.on_failure(project)
             if self.env.verbose:
                 print(f"Processed {n_wrkrs} {self.q_type} actions", mark=2)
@@ -231,9 +252,9 @@ class PSPQueue:
         if chunk == 0:
             # input closed
             return True
-        for name, data in json.loads(
+        for key, data in json.loads(
                 pipe.recv(chunk).decode('utf-8')).items():
-            self.queue[name] = GitProject(data=data)
+            self.queue[key] = GitProject(data=data)
         return False
 
     def copy_to_server(self, project: GitProject = None):
@@ -243,7 +264,7 @@ class PSPQueue:
         '''
         if project is None:
             return
-        self.queue[project.name] = project
+        self.queue[project.key] = project
         json_t = json.dumps(self.queue, cls=GitProjEncoder).encode('utf-8')
         self._client.send(len(json_t).to_bytes(length=64, byteorder='big'))
         self._client.send(json_t)
@@ -280,21 +301,26 @@ class TermQueue(PSPQueue):
         '''
         Child: store GitProject state
         '''
-        with open(self.env.clone_dir.joinpath('.pspman.healthy.yml'),
-                  'a') as db_handle:
-            yaml.dump({project.name: project.__dict__}, db_handle)
+        clone_dir = self.env_of(project).clone_dir
+        with state_lock(clone_dir):
+            with open(clone_dir.joinpath('.pspman.healthy.yml'),
+                      'a') as db_handle:
+                yaml.dump({project.name: project.record()}, db_handle)
 
-        with open(self.env.clone_dir.joinpath('.pspman.fail.yml'),
-                  'a') as fail_handle:
-            yaml.dump({project.name: None}, fail_handle)
+            with open(clone_dir.joinpath('.pspman.fail.yml'),
+                      'a') as fail_handle:
+                yaml.dump({project.name: None}, fail_handle)
+            index_add(clone_dir, project.name)
 
     def on_failure(self, project: GitProject):
         '''
         Child: store GitProject state
         '''
-        with open(self.env.clone_dir.joinpath('.pspman.fail.yml'),
-                  'a') as db_handle:
-            yaml.dump({project.name: project.__dict__}, db_handle)
+        clone_dir = self.env_of(project).clone_dir
+        with state_lock(clone_dir):
+            with open(clone_dir.joinpath('.pspman.fail.yml'),
+                      'a') as db_handle:
+                yaml.dump({project.name: project.record()}, db_handle)
 
 
 class SuccessQueue(TermQueue):
@@ -327,12 +353,15 @@ class DeleteQueue(TermQueue):
         '''
         run on success
         '''
-        with open(self.env.clone_dir.joinpath('.pspman.healthy.yml'),
-                  'a') as db_handle:
-            yaml.dump({project.name: None}, db_handle)
-        with open(self.env.clone_dir.joinpath('.pspman.fail.yml'),
-                  'a') as db_handle:
-            yaml.dump({project.name: None}, db_handle)
+        clone_dir = self.env_of(project).clone_dir
+        with state_lock(clone_dir):
+            with open(clone_dir.joinpath('.pspman.healthy.yml'),
+                      'a') as db_handle:
+                yaml.dump({project.name: None}, db_handle)
+            with open(clone_dir.joinpath('.pspman.fail.yml'),
+                      'a') as db_handle:
+                yaml.dump({project.name: None}, db_handle)
+            index_drop(clone_dir, project.name)
         if self.downstream_qs['success'] is not None:
             self.downstream_qs['success'].add(None)
 
@@ -345,6 +374,19 @@ class InstallQueue(PSPQueue):
         super().__init__(env=env, action=install, q_type='install',
                          success=success, fail=fail, **kwargs)
 
+    def run_batch(self) -> None:
+        '''
+        Child: resolve requirements of the batch together (per group),
+        then install
+        '''
+        batches: typing.Dict[typing.Optional[str],
+                             typing.List[GitProject]] = {}
+        for project in self.queue.values():
+            batches.setdefault(project.group, []).append(project)
+        for projects in batches.values():
+            resolve_requirements(self.env_of(projects[0]), projects)
+        super().run_batch()
+
 
 class PullQueue(PSPQueue):
     '''
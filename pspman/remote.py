@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8; mode:python -*-
+#
+# Copyright 2020 Pradyumna Paranjape
+# This file is part of pspman.
+#
+# pspman is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pspman is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with pspman.  If not, see <https://www.gnu.org/licenses/>.
+#
+'''
+Remote hosts: throttling, retrying and multiplexing network actions
+
+'''
+
+
+import os
+import re
+import stat
+import time
+import fcntl
+import random
+import typing
+import tempfile
+import subprocess
+import contextlib
+from pathlib import Path
+from .errors import CommandError, RuntimeDirError
+
+
+TRANSIENT_ERRORS: typing.Tuple[str, ...] = (
+    'could not resolve host',
+    'temporary failure in name resolution',
+    'connection timed out',
+    'operation timed out',
+    'connection reset',
+    'connection refused',
+    'connection closed',
+    'early eof',
+    'rpc failed',
+    'the remote end hung up unexpectedly',
+    'unexpected disconnect',
+    'gnutls recv error',
+    'ssl_read',
+    'too many requests',
+    'rate limit',
+    'error: 429',
+    'error: 500',
+    'error: 502',
+    'error: 503',
+    'error: 504',
+)
+'''
+Fragments of (lower-cased) git stderr that indicate a transient failure
+'''
+
+UNREACHABLE_ERRORS: typing.Tuple[str, ...] = (
+    'no route to host',
+    'network is unreachable',
+    'killed after',
+)
+'''
+Fragments of (lower-cased) git stderr that indicate an unreachable remote,
+besides transient failures; retries won't help, but local sources may
+'''
+
+
+def runtime_dir(create: bool = True) -> Path:
+    '''
+    Private per-user directory for locks and sockets shared by all
+    pspman processes of this user
+
+    Args:
+        create: create the directory if it doesn't exist
+
+    Returns:
+        Path to runtime directory (which may not exist, if not ``create``)
+
+    Raises:
+        RuntimeDirError: directory is a symbolic link,
+            not owned by the user, or accessible to others
+    '''
+    run_dir = Path(os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir())
+    run_dir = run_dir.joinpath(f'pspman-{os.getuid()}')
+    if create:
+        run_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+    try:
+        run_stat = os.lstat(run_dir)
+    except FileNotFoundError:
+        if create:
+            raise
+        return run_dir
+    # shared temporary directory: it may have been planted by another user
+    if stat.S_ISLNK(run_stat.st_mode) or run_stat.st_uid != os.getuid()\
+       or stat.S_IMODE(run_stat.st_mode) != 0o700:
+        raise RuntimeDirError(run_dir)
+    return run_dir
+
+
+def url_host(url: typing.Optional[str]) -> typing.Optional[str]:
+    '''
+    Remote host serving the url
+
+    Args:
+        url: git remote url
+
+            * scheme://[user@]host[:port]/path
+            * [user@]host:path (scp-like)
+            * local paths have no host
+
+    Returns:
+        host name, ``None`` for local sources
+    '''
+    if not url:
+        return None
+    scheme = re.match(r'^([a-z0-9+.-]+)://', url, re.I)
+    if scheme is not None:
+        if scheme.group(1).lower() == 'file':
+            return None
+        uri = re.match(r'^[^:]+://(?:[^@/]*@)?([^/:]+)', url)
+        return uri.group(1).lower() if uri is not None else None
+    scp = re.match(r'^(?:[^@/]*@)?([^/:]+):', url)
+    if scp is not None:
+        return scp.group(1).lower()
+    return None
+
+
+def is_transient(err: typing.Optional[str]) -> bool:
+    '''
+    Does the stderr suggest that a retry may succeed?
+
+    Args:
+        err: stderr from failed git command
+
+    '''
+    if not err:
+        return False
+    err = err.lower()
+    return any(fragment in err for fragment in TRANSIENT_ERRORS)
+
+
+def is_unreachable(err: typing.Optional[str]) -> bool:
+    '''
+    Does the stderr suggest that the remote couldn't be reached?
+    (as opposed to rejections: non-fast-forward, unknown branch, auth, ...)
+
+    Args:
+        err: stderr from failed git command
+
+    '''
+    if is_transient(err):
+        return True
+    if not err:
+        return False
+    err = err.lower()
+    return any(fragment in err for fragment in UNREACHABLE_ERRORS)
+
+
+def backoff(attempt: int, base: float = 2.) -> float:
+    '''
+    Exponential back-off with full jitter
+
+    Args:
+        attempt: count of failed attempts (starting with 0)
+        base: base wait (seconds)
+
+    Returns:
+        seconds to wait before the next attempt
+    '''
+    return random.uniform(base / 2, base * 2 ** attempt)
+
+
+@contextlib.contextmanager
+def host_slot(host: typing.Optional[str], limit: int = 0,
+              poll: float = 0.5) -> typing.Iterator[None]:
+    '''
+    Occupy one of ``limit`` connection slots to ``host``.
+    Slots are ``flock`` ed files, shared by all pspman processes
+    and released even if the holder dies.
+
+    Args:
+        host: remote host, ``None`` is not throttled
+        limit: maximum simultaneous connections, ``< 1`` is unlimited
+        poll: wait between attempts to occupy a slot (seconds)
+
+    '''
+    if host is None or limit < 1:
+        yield
+        return
+    slot_dir = runtime_dir().joinpath('hosts')
+    slot_dir.mkdir(exist_ok=True)
+    while True:
+        for slot in range(limit):
+            slot_fh = open(slot_dir.joinpath(f'{host}.{slot}.lock'), 'w')
+            try:
+                fcntl.flock(slot_fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                slot_fh.close()
+                continue
+            try:
+                yield
+            finally:
+                fcntl.flock(slot_fh, fcntl.LOCK_UN)
+                slot_fh.close()
+            return
+        time.sleep(random.uniform(poll / 2, poll * 2))
+
+
+def retry(call: typing.Callable[[], typing.Optional[str]],
+          url: typing.Optional[str], retries: int = 3, host_jobs: int = 0,
+          name: str = None) -> typing.Tuple[typing.Optional[str], bool]:
+    '''
+    Call a network action, retrying transient failures
+
+    Args:
+        call: git action that raises ``CommandError`` on failure
+        url: remote url that ``call`` connects to
+        retries: maximum retries after the first attempt
+        host_jobs: connections allowed simultaneously to the same host
+        name: name of project, for messages
+
+    Returns:
+        Output of ``call`` (``None`` if all attempts failed),
+        did the last failure suggest that the remote is unreachable?
+    '''
+    host = url_host(url)
+    for attempt in range(retries + 1):
+        with host_slot(host, limit=host_jobs):
+            try:
+                return call(), False
+            except CommandError as err:
+                if attempt == retries or not is_transient(err.err):
+                    return None, is_unreachable(err.err)
+        wait = backoff(attempt)
+        from . import print
+        print(f'{name or url}: transient failure, retry in {wait:.1f}s',
+              mark='warn')
+        time.sleep(wait)
+    return None, True
+
+
+def ssh_target(url: typing.Optional[str]) -> typing.Optional[
+        typing.Tuple[typing.Optional[str], str, typing.Optional[str]]]:
+    '''
+    SSH destination of the url
+
+    Args:
+        url: git remote url
+
+    Returns:
+        user, host, port; ``None`` if the url is not served over ssh
+    '''
+    if not url:
+        return None
+    uri = re.match(r'^(?:ssh|git\+ssh|ssh\+git)://(?:([^@/]*)@)?'
+                   + r'([^/:]+)(?::(\d+))?/', url, re.I)
+    if uri is not None:
+        return uri.group(1), uri.group(2), uri.group(3)
+    if re.match(r'^[a-z0-9+.-]+://', url, re.I):
+        # some other scheme
+        return None
+    scp = re.match(r'^(?:([^@/]*)@)?([^/:]+):', url)
+    if scp is not None:
+        return scp.group(1), scp.group(2), None
+    return None
+
+
+class SSHMux():
+    '''
+    Multiplex all ssh connections of a run through one ControlMaster
+    per remote host
+
+    Args:
+        urls: remote urls that shall be contacted during the run
+
+    Attributes:
+        targets: ssh destinations (user, host, port)
+        control_path: ControlPath of masters, private to the run
+        masters: destinations whose masters were started
+
+    '''
+    def __init__(self, urls: typing.Iterable[typing.Optional[str]]):
+        self.targets = set(filter(None, (ssh_target(url) for url in urls)))
+        ctl_dir = runtime_dir().joinpath('ssh')
+        ctl_dir.mkdir(mode=0o700, exist_ok=True)
+        # own masters: overlapping runs must not close each other's
+        self.control_path = str(ctl_dir.joinpath(f'{os.getpid()}.%C'))
+        self.masters: typing.List[typing.Tuple[typing.Optional[str], str,
+                                               typing.Optional[str]]] = []
+        self._git_ssh: typing.Optional[str] = None
+        self._owner: typing.Optional[int] = None
+
+    @staticmethod
+    def _dest(target: typing.Tuple[typing.Optional[str], str,
+                                   typing.Optional[str]]) -> typing.List[str]:
+        '''
+        ssh arguments addressing the target
+        '''
+        user, host, port = target
+        dest = ['-p', port] if port else []
+        return dest + [f'{user}@{host}' if user else host]
+
+    def _reap(self):
+        '''
+        Close masters left behind by runs that died
+        '''
+        for control in Path(self.control_path).parent.iterdir():
+            pid = control.name.partition('.')[0]
+            if not pid.isdigit():
+                continue
+            try:
+                os.kill(int(pid), 0)
+                continue
+            except ProcessLookupError:
+                pass
+            except PermissionError:
+                continue
+            # the path addresses the master, whatever the destination
+            subprocess.run(['ssh', '-o', f'ControlPath={control}',
+                            '-O', 'exit', 'localhost'],
+                           stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL, check=False)
+
+    def start(self, timeout: int = 30) -> int:
+        '''
+        Start masters (in parallel) and direct git to use them
+
+        Args:
+            timeout: seconds allowed for each master to connect
+
+        Returns:
+            Number of masters started
+        '''
+        if os.environ.get('GIT_SSH') or not self.targets:
+            # custom ssh program: do not interfere
+            return 0
+        self._reap()
+        self._git_ssh = os.environ.get('GIT_SSH_COMMAND')
+        self._owner = os.getpid()
+        base = ['ssh', '-o', f'ControlPath={self.control_path}']
+        starting = {target: subprocess.Popen(
+            base + ['-o', 'ControlMaster=yes', '-o', 'ControlPersist=yes',
+                    '-o', 'BatchMode=yes', '-o', f'ConnectTimeout={timeout}',
+                    '-f', '-N'] + self._dest(target),
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        ) for target in self.targets}
+        for target, proc in starting.items():
+            try:
+                if proc.wait(timeout=timeout) == 0:
+                    self.masters.append(target)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        if not self.masters:
+            return 0
+        # Connections fall back to a direct handshake without a master
+        os.environ['GIT_SSH_COMMAND'] = ' '.join(
+            (self._git_ssh or 'ssh', '-o', 'ControlMaster=no',
+             '-o', f'ControlPath={self.control_path}')
+        )
+        return len(self.masters)
+
+    def stop(self):
+        '''
+        Tear down masters and restore git's ssh command.
+        Forked children (queues) inherit the masters, but may not stop them.
+        '''
+        if self._owner != os.getpid():
+            return
+        for target in self.masters:
+            subprocess.run(['ssh', '-o', f'ControlPath={self.control_path}',
+                            '-O', 'exit'] + self._dest(target),
+                           stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL, check=False)
+        self.masters = []
+        self._owner = None
+        if self._git_ssh is None:
+            os.environ.pop('GIT_SSH_COMMAND', None)
+        else:
+            os.environ['GIT_SSH_COMMAND'] = self._git_ssh
+
+
+def local_sources(url: typing.Optional[str], name: str,
+                  drop_dir: typing.Union[str, os.PathLike] = None,
+                  url_rewrite: typing.Dict[str, str] = None
+                  ) -> typing.List[str]:
+    '''
+    Local stand-ins (git bundles, clones) for an unreachable remote
+
+    Looked up in order:
+
+        * ``url`` rewritten by the longest matching prefix in ``url_rewrite``
+          (and the same path suffixed with ``.bundle``)
+        * drop_dir/<name>.bundle
+        * drop_dir/<name>.git
+        * drop_dir/<name>
+
+    Args:
+        url: remote url of project
+        name: name of project
+        drop_dir: directory in which bundles/clones are dropped
+        url_rewrite: remote url prefix: local path prefix
+
+    Returns:
+        Existing local sources
+    '''
+    candidates: typing.List[Path] = []
+    if url:
+        prefixes = [prefix for prefix in (url_rewrite or {})
+                    if url.startswith(prefix)]
+        if prefixes:
+            prefix = max(prefixes, key=len)
+            local = url_rewrite[prefix] + url[len(prefix):]
+            candidates.extend((Path(local), Path(local + '.bundle')))
+    if drop_dir:
+        drop_path = Path(drop_dir)
+        candidates.extend(drop_path.joinpath(name + suffix)
+                          for suffix in ('.bundle', '.git', ''))
+    return [str(source) for source in candidates if source.exists()]
@@ -24,17 +24,118 @@ Actions on projects, other than automated installations
 
 
 import os
+import copy
 import typing
 import re
+from pathlib import Path
 import yaml
 from .config import MetaConfig
 from . import print, CONFIG
 from .shell import git_list
+from .completion import write_index
+from .define import lock_project, state_lock
 from .classes import InstallEnv, GitProject
 from .queues import (PSPQueue, PullQueue, FailQueue, CloneQueue,
                      SuccessQueue, DeleteQueue, InstallQueue)
 
 
+_DB_CACHE: typing.Dict[str, typing.Tuple[typing.Tuple[int, int],
+                                          typing.Any]] = {}
+'''
+Parsed databases: path: ((mtime_ns, size), contents),
+retained while the file is unchanged (kept warm by the daemon)
+'''
+
+_REMOTES: typing.Dict[str, typing.Tuple[int, typing.Optional[str]]] = {}
+'''
+Discovered clones: path: (mtime_ns of git config, url),
+retained while the git config is unchanged (kept warm by the daemon)
+'''
+
+
+def _read_db(db_path: Path) -> typing.Any:
+    '''
+    Contents of database file, parsed unless cached.
+    Cached contents are copied: loaded projects may be modified.
+    '''
+    stat = db_path.stat()
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    cached = _DB_CACHE.get(str(db_path))
+    if cached is not None and cached[0] == stamp:
+        return copy.deepcopy(cached[1])
+    with open(db_path, 'r') as db_handle:
+        d_base = yaml.load(db_handle, Loader=yaml.Loader)
+    _DB_CACHE[str(db_path)] = (stamp, d_base)
+    return d_base
+
+
+def _remote_url(leaf: Path) -> typing.Optional[str]:
+    '''
+    Remote url of clone, looked up unless cached
+    '''
+    try:
+        mtime = leaf.joinpath('.git', 'config').stat().st_mtime_ns
+    except OSError:
+        return git_list(clone_dir=leaf)
+    cached = _REMOTES.get(str(leaf))
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    url = git_list(clone_dir=leaf)
+    _REMOTES[str(leaf)] = (mtime, url)
+    return url
+
+
+def warm_registry(config: MetaConfig = None):
+    '''
+    Parse databases and discover clones of all known groups,
+    so that processes forked later find them cached
+
+    Args:
+        config: pspman configuration
+
+    '''
+    config = config or CONFIG
+    for group in config.meta_db_dirs.values():
+        clone_dir = group.grp_path.joinpath('src')
+        if not clone_dir.is_dir():
+            continue
+        for fname in '.pspman.healthy.yml', '.pspman.fail.yml':
+            if clone_dir.joinpath(fname).is_file():
+                _read_db(clone_dir.joinpath(fname))
+        for leaf in clone_dir.iterdir():
+            if leaf.joinpath('.git').is_dir():
+                _remote_url(leaf)
+
+
+def _backup(db_path: Path) -> Path:
+    '''
+    Backup of database file (recovered by ``pspman unlock``)
+    '''
+    return db_path.with_suffix(f'{db_path.suffix}.bak')
+
+
+def _write_db(db_path: Path, projects: typing.Dict[str, GitProject]):
+    '''
+    Leave a memory of read database: one entry per project.
+    An unchanged database is not rewritten, so that it stays cached.
+    Otherwise, the previous database is retained as backup.
+
+    Args:
+        db_path: path to database file
+        projects: projects to record
+
+    '''
+    memory = ''.join(yaml.dump({name: project.record()})
+                     for name, project in projects.items()
+                     if project is not None)
+    if db_path.is_file():
+        if db_path.read_text() == memory:
+            return
+        # Older backup (if it exists) is erased
+        db_path.replace(_backup(db_path))
+    db_path.write_text(memory)
+
+
 def load_db(env: InstallEnv, fname: str) -> typing.Dict[str, GitProject]:
     '''
     Find database file (yml) and load its contents
@@ -52,23 +153,16 @@ def load_db(env: InstallEnv, fname: str) -> typing.Dict[str, GitProject]:
     # DELETE registers project name as ``None``
 
     db_path = env.clone_dir.joinpath(fname)
-    ext = db_path.suffix
     git_projects: typing.Dict[str, GitProject]= {}
     if not db_path.is_file():
-        if not db_path.with_suffix(f'.{ext}.bak').is_file():
+        if not _backup(db_path).is_file():
             # nothing found
             return git_projects
         # backup exists
-        with open(db_path.with_suffix(f'.{ext}.bak'), 'r') as db_handle:
-             d_base = yaml.load(db_handle, Loader=yaml.Loader)
+        d_base = _read_db(_backup(db_path))
     else:
         # database file does exist
-        with open(db_path, 'r') as db_handle:
-            d_base = yaml.load(db_handle, Loader=yaml.Loader)
-
-        # Copy a backup
-        # Older backup (if it exists) is erased
-        db_path.replace(db_path.with_suffix(f'.{ext}.bak'))
+        d_base = _read_db(db_path)
 
     if d_base is None:
         return git_projects
@@ -97,8 +191,6 @@ def find_gits(env: InstallEnv, git_projects: typing.Dict[str, GitProject]
     # discover projects
     git_projects = git_projects or {}
     discovered_projects: typing.Dict[str, GitProject] = {}
-    healthy_db = load_db(env=env, fname=f'.pspman.healthy.yml')
-    fail_db = load_db(env=env, fname=f'.pspman.fail.yml')
     for leaf in env.clone_dir.iterdir():
         name = leaf.name
         if not leaf.is_dir():
@@ -107,23 +199,23 @@ def find_gits(env: InstallEnv, git_projects: typing.Dict[str, GitProject]
             continue
         if name in git_projects:
             continue
-        url = git_list(clone_dir=leaf)
+        url = _remote_url(leaf)
         if url is None:
             continue
         discovered_projects[name] = GitProject(url=url, name=name)
-    git_projects.update({**discovered_projects, **healthy_db})
-
-    # Leave a memory of read database
-    with open(env.clone_dir.joinpath('.pspman.healthy.yml'),
-              'w') as mem_handle:
-        for name, project in git_projects.items():
-            if project is not None:
-                yaml.dump({name: project.__dict__}, mem_handle)
-    with open(env.clone_dir.joinpath('.pspman.fail.yml'),
-              'w') as mem_handle:
-        for name, project in fail_db.items():
-            if project is not None:
-                yaml.dump({name: project.__dict__}, mem_handle)
+
+    # other runs commit their states meanwhile
+    with state_lock(env.clone_dir):
+        healthy_db = load_db(env=env, fname=f'.pspman.healthy.yml')
+        fail_db = load_db(env=env, fname=f'.pspman.fail.yml')
+        git_projects.update({**discovered_projects, **healthy_db})
+
+        _write_db(env.clone_dir.joinpath('.pspman.healthy.yml'),
+                  git_projects)
+        _write_db(env.clone_dir.joinpath('.pspman.fail.yml'), fail_db)
+        write_index(env.clone_dir,
+                    (name for name, project in git_projects.items()
+                     if project is not None))
     return git_projects, fail_db
 
 
@@ -182,22 +274,62 @@ def print_prefixes(env: InstallEnv, config: MetaConfig = None):
     return 0
 
 
-def init_queues(env: InstallEnv,) -> typing.Dict[str, PSPQueue]:
+def group_envs(env: InstallEnv, names: typing.List[str] = None,
+               config: MetaConfig = None,
+               group_cache: bool = True) -> typing.List[InstallEnv]:
+    '''
+    Installation contexts of groups, modelled on env
+
+    Args:
+        env: Installation context (options of the call)
+        names: names (or paths) of groups [default: all known groups]
+        config: pspman configuration
+        group_cache: use compiler cache remembered by each group
+
+    Returns:
+        Contexts, one per group, empty if a group is unknown
+
+    '''
+    config = config or CONFIG
+    groups = []
+    for name in names or list(config.meta_db_dirs):
+        group = config.meta_db_dirs.get(name) or config.find(name)
+        if group is None:
+            print(f'Group {name} is not known', mark='err')
+            return []
+        if group not in groups and group.exists:
+            groups.append(group)
+    envs: typing.List[InstallEnv] = []
+    for group in groups:
+        grp_env = copy.copy(env)
+        grp_env.prefix = group.grp_path
+        del grp_env.clone_dir
+        if group_cache:
+            grp_env.compiler_cache = group.compiler_cache
+        envs.append(grp_env)
+    return envs
+
+
+def init_queues(env: InstallEnv,
+                envs: typing.Iterable[InstallEnv] = None
+                ) -> typing.Dict[str, PSPQueue]:
     '''
     Initiate success queues
 
     Args:
         env: Installation context
+        envs: Installation contexts of groups whose projects share the queues
 
     '''
+    grp_envs = {str(grp_env.prefix): grp_env for grp_env in envs or []}
     queues: typing.Dict[str, PSPQueue] = {}
-    queues['success'] = SuccessQueue(env=env)
-    queues['fail'] = FailQueue(env=env)
+    queues['success'] = SuccessQueue(env=env, envs=grp_envs)
+    queues['fail'] = FailQueue(env=env, envs=grp_envs)
     queues['install'] = queues['success'] if env.pull\
         else InstallQueue(env=env, success=queues['success'],
-                          fail=queues['fail'])
+                          fail=queues['fail'], envs=grp_envs)
     queues['delete'] = DeleteQueue(env=env, success=queues['success'],
-                                   fail=queues['fail'])
+                                   fail=queues['fail'], envs=grp_envs)
     return queues
 
 
@@ -222,9 +354,12 @@ def del_projects(env: InstallEnv, git_projects: typing.Dict[str, GitProject],
         if project_name not in git_projects:
             print(f"Couldn't find {project_name} in {env.clone_dir}", mark=3)
             print('Ignoring...', mark=0)
-            with open(env.clone_dir.joinpath('.pspman.fail.yml'),
-                      'a') as fail_handle:
-                yaml.dump({project_name: None}, fail_handle)
+            with state_lock(env.clone_dir):
+                with open(env.clone_dir.joinpath('.pspman.fail.yml'),
+                          'a') as fail_handle:
+                    yaml.dump({project_name: None}, fail_handle)
+            continue
+        if not lock_project(env, project_name):
             continue
         project = git_projects[project_name]
         queues['delete'].add(project)
@@ -233,9 +368,9 @@ def del_projects(env: InstallEnv, git_projects: typing.Dict[str, GitProject],
     return git_projects
 
 
-def _parse_inst(inst_input: str) -> typing.Tuple[str, typing.Optional[str],
-                                                 typing.List[str],
-                                                 typing.Dict[str, str], bool]:
+def parse_inst(inst_input: str) -> typing.Tuple[str, typing.Optional[str],
+                                                typing.List[str],
+                                                typing.Dict[str, str], bool]:
     '''
     parse installation string to extract parts
     inst_input is assumed to be of the form:
@@ -295,10 +430,11 @@ def add_projects(env: InstallEnv, git_projects: typing.Dict[str, GitProject],
     '''
     to_add_list = to_add_list or []
     queues['clone'] = CloneQueue(env=env, success=queues['install'],
-                                 fail=queues['fail'])
+                                 fail=queues['fail'],
+                                 envs=queues['fail'].envs)
     added_projects: typing.List[str] = []
     for inst_input in to_add_list:
-        url, branch, inst_argv, sh_env, pull = _parse_inst(inst_input)
+        url, branch, inst_argv, sh_env, pull = parse_inst(inst_input)
         new_project = GitProject(url=url, sh_env=sh_env, inst_argv=inst_argv,
                                  branch=branch, pull=pull)
         if env.clone_dir.joinpath(new_project.name).is_file():
@@ -316,6 +452,8 @@ def add_projects(env: InstallEnv, git_projects: typing.Dict[str, GitProject],
                   mark=3)
             print("I won't overwrite", mark=0)
             continue
+        if not lock_project(env, new_project.name):
+            continue
         added_projects.append(new_project.name)
         queues['clone'].add(new_project)
     queues['clone'].done()
@@ -329,13 +467,15 @@ def update_projects(env: InstallEnv,
 
     Args:
         env: Installation context
-        git_projects: known git projects
+        git_projects: known git projects (of all groups sharing the queues)
         queues: initiated queues
 
     '''
     queues['pull'] = PullQueue(env=env, success=queues['install'],
-                               fail=queues['fail'])
+                               fail=queues['fail'], envs=queues['fail'].envs)
     for project in git_projects.values():
+        if not lock_project(queues['pull'].env_of(project), project.name):
+            continue
         if env.verbose:
             print(f'Pushing {project} to pull-queue')
         queues['pull'].add(project)
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8; mode:python -*-
+#
+# Copyright 2020 Pradyumna Paranjape
+# This file is part of pspman.
+#
+# pspman is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pspman is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with pspman.  If not, see <https://www.gnu.org/licenses/>.
+#
+'''
+Sharing fetches and builds among groups updated in the same run
+
+Markers are kept in a run-scoped directory (``InstallEnv.share_dir``),
+removed at the end of the run:
+
+    * <kind>.<key>.lock: held (flock) by the worker that fetches/builds
+      the key; peers wait for it.
+    * <kind>.<key>: recorded by that worker on success,
+      what peers reuse (path of the clone, stored build).
+    * <kind>.tally: ``hit``/``miss`` per use of a key.
+
+Fetches are keyed by URL and branch. Builds are keyed by
+``artifacts.artifact_key`` without the prefix, and are shared only if
+the installation method is relocatable.
+
+'''
+
+
+import os
+import json
+import fcntl
+import typing
+import hashlib
+import contextlib
+from pathlib import Path
+from . import print
+
+
+SHARED_KINDS: typing.Dict[str, str] = {'fetch': 'fetches', 'build': 'builds'}
+'''
+What may be shared: label in reports
+'''
+
+
+def share_key(*parts: typing.Any) -> str:
+    '''
+    Key that identifies shareable work
+
+    Args:
+        *parts: json-serializable inputs that determine the work
+
+    Returns:
+        hex digest
+    '''
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode('utf-8')
+                          ).hexdigest()
+
+
+@contextlib.contextmanager
+def claim(share_dir: typing.Optional[str], kind: str,
+          key: typing.Optional[str]) -> typing.Iterator[typing.Optional[str]]:
+    '''
+    Hold the key, waiting for peers that hold it
+
+    Args:
+        share_dir: run-scoped directory, ``None``: nothing is shared
+        kind: kind of work in ``SHARED_KINDS``
+        key: key of work, ``None``: not shareable
+
+    Yields:
+        what a peer recorded for the key, ``None`` if nothing
+    '''
+    if share_dir is None or key is None:
+        yield None
+        return
+    with open(Path(share_dir).joinpath(f'{kind}.{key}.lock'), 'w') as lock_fh:
+        fcntl.flock(lock_fh, fcntl.LOCK_EX)
+        marker = Path(share_dir).joinpath(f'{kind}.{key}')
+        yield marker.read_text() if marker.is_file() else None
+
+
+def record(share_dir: typing.Optional[str], kind: str,
+           key: typing.Optional[str], value: str):
+    '''
+    Record work for peers (while holding the key)
+
+    Args:
+        share_dir: run-scoped directory, ``None``: nothing is shared
+        kind: kind of work in ``SHARED_KINDS``
+        key: key of work, ``None``: not shareable
+        value: what peers reuse
+
+    '''
+    if share_dir is None or key is None:
+        return
+    Path(share_dir).joinpath(f'{kind}.{key}').write_text(value)
+
+
+def tally(share_dir: typing.Optional[str], kind: str, hit: bool):
+    '''
+    Count a use of shareable work
+
+    Args:
+        share_dir: run-scoped directory, ``None``: nothing is shared
+        kind: kind of work in ``SHARED_KINDS``
+        hit: work of a peer was reused
+
+    '''
+    if share_dir is None:
+        return
+    tally_fd = os.open(Path(share_dir).joinpath(f'{kind}.tally'),
+                       os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(tally_fd, b'hit\n' if hit else b'miss\n')
+    finally:
+        os.close(tally_fd)
+
+
+def report(share_dir: str):
+    '''
+    Print hits and misses of shared work
+
+    Args:
+        share_dir: run-scoped directory
+
+    '''
+    for kind, label in SHARED_KINDS.items():
+        tally_file = Path(share_dir).joinpath(f'{kind}.tally')
+        if not tally_file.is_file():
+            continue
+        uses = tally_file.read_text().split()
+        print(f'shared {label}: {uses.count("hit")} hits, '
+              + f'{uses.count("miss")} misses', mark='info')
@@ -20,20 +20,99 @@
 '''
 shell functions
 
+Git is driven through a :class:`GitBackend`.
+The default :class:`CliGit` runs the git command for every action.
+:class:`InProcGit` answers read-only queries from the repository's files,
+without creating a process.
+
 '''
 
 
 import os
+import abc
+import signal
 import typing
+import resource
 import subprocess
 from pathlib import Path
 import re
 from .errors import CommandError
+from .logs import stream_log
 from . import print
 
+try:
+    import pygit2
+except ImportError:
+    pygit2 = None
+
+
+RLIMITS: typing.Dict[str, int] = {
+    'cpu': resource.RLIMIT_CPU,
+    'as': resource.RLIMIT_AS,
+    'data': resource.RLIMIT_DATA,
+    'fsize': resource.RLIMIT_FSIZE,
+}
+'''
+Resource limits that may be set on a command:
+cpu time (seconds), address space, data segment, file size (bytes)
+'''
+
+_SIZE = re.compile(r'(\d+)\s*([kmgt]?)i?b?', re.IGNORECASE)
+
 
-def process_comm(*cmd: str, p_name: str = 'processing', timeout: int = None,
-                 fail_handle: str = 'fail', **kwargs) -> typing.Optional[str]:
+def parse_limits(limits: typing.Dict[str, typing.Any]) -> typing.Dict[str, int]:
+    '''
+    Parse resource limits
+
+    Args:
+        limits: ``RLIMITS`` key: integer or size with suffix K, M, G, T
+
+    Returns:
+        ``RLIMITS`` key: integer value
+
+    Raises:
+        ValueError: unknown limit or bad value
+    '''
+    parsed: typing.Dict[str, int] = {}
+    for key, val in limits.items():
+        if key not in RLIMITS:
+            raise ValueError(f'unknown limit: {key}')
+        size = _SIZE.fullmatch(str(val).strip())
+        if size is None:
+            raise ValueError(f'bad value of limit {key}: {val}')
+        parsed[key] = int(size.group(1)) * 1024 ** ' kmgt'.index(
+            size.group(2).lower() or ' ')
+    return parsed
+
+
+def _limiter(limits: typing.Dict[str, int]) -> typing.Callable[[], None]:
+    '''
+    Function that applies limits in the child process before exec
+    '''
+    def set_limits():
+        for key, val in limits.items():
+            _, hard = resource.getrlimit(RLIMITS[key])
+            if hard != resource.RLIM_INFINITY:
+                val = min(val, hard)
+            resource.setrlimit(RLIMITS[key], (val, val))
+    return set_limits
+
+
+def _kill_tree(process: subprocess.Popen):
+    '''
+    Kill process and its descendants (its session's process group)
+    '''
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        # already reaped
+        pass
+
+
+def process_comm(*cmd: str, p_name: str = 'processing', timeout: float = None,
+                 fail_handle: str = 'fail',
+                 limits: typing.Dict[str, int] = None, log: Path = None,
+                 **kwargs) -> typing.Optional[str]:
     '''
     Generic process definition and communication.
     Raw actions, outputs, errors are displayed
@@ -43,12 +122,17 @@ def process_comm(*cmd: str, p_name: str = 'processing', timeout: int = None,
     Args:
         *cmd: list(cmd) is passed to subprocess.Popen as first argument
         p_name: notified as 'Error {p_name}: {stderr}
-        timeout: communicatoin timeout. If -1, 'communicate' isn't called
+        timeout: communicatoin timeout. If -1, 'communicate' isn't called.
+            On expiry, the command and all its descendants are killed
+            and the command fails.
         fail: {fail,nag,report,ignore}
             * fail: raises CommandError
             * nag: Returns None, prints stderr
             * report: returns None, but hides stderr
             * ignore: returns stdout, despite error (default behaviour)
+        limits: resource limits (parsed by ``parse_limits``)
+        log: stream output (stdout and stderr) to this gzipped file;
+            only its tail is retained (as stderr), stdout is not returned
         **kwargs: all are passed to ``subprocess.Popen``
 
     Returns:
@@ -63,9 +147,50 @@ def process_comm(*cmd: str, p_name: str = 'processing', timeout: int = None,
     if timeout is not None and timeout < 0:
         process = subprocess.Popen(cmd_l, **kwargs)  # DONT: *cmd_l here
         return None
-    process = subprocess.Popen(cmd_l, stdout=subprocess.PIPE,
-                               stderr=subprocess.PIPE, text=True, **kwargs)
-    stdout, stderr = process.communicate(timeout=timeout)
+    group = timeout is not None or bool(limits)
+    if group:
+        # own process group, so that the whole tree may be killed
+        kwargs['start_new_session'] = True
+    if limits:
+        kwargs['preexec_fn'] = _limiter(limits)
+    if log is not None:
+        kwargs.update({'stderr': subprocess.STDOUT, 'errors': 'replace'})
+    else:
+        kwargs['stderr'] = subprocess.PIPE
+    try:
+        process = subprocess.Popen(cmd_l, stdout=subprocess.PIPE,
+                                   text=True, **kwargs)
+    except OSError as err:
+        # command not found, not executable
+        if fail_handle == 'fail':
+            raise CommandError(cmd_l, str(err)) from err
+        if fail_handle == 'nag':
+            print(err, mark=4)
+        return None
+    try:
+        if log is None:
+            stdout, stderr = process.communicate(timeout=timeout)
+        else:
+            stdout = ''
+            stderr = stream_log(process, log, timeout=timeout,
+                                kill=_kill_tree)
+    except subprocess.TimeoutExpired:
+        _kill_tree(process)
+        try:
+            stdout, stderr = process.communicate(timeout=5)
+        except subprocess.TimeoutExpired:
+            # descendants that left the group hold the pipes
+            process.stdout.close()
+            process.stderr.close()
+            process.wait()
+            stdout, stderr = '', ''
+        stderr = f'{stderr}\n{p_name}: killed after {timeout} seconds'
+    except KeyboardInterrupt:
+        if group:
+            # not in the foreground process group: didn't get SIGINT
+            _kill_tree(process)
+            process.wait()
+        raise
     if os.environ.get('DEBUG', False):
         print(cmd_l, mark='act')
         print(stdout, mark='bug')
@@ -91,6 +216,8 @@ def git_comm(cmd: typing.List[str], g_name: str = 'process', gitkwargs:
         cmd: command list to run
         gitkwargs: parsed from to --key[=val] and passed to git command
         prockwargs: passed to ``process_comm``
+            ``fail_handle`` defaults to 'report'
+            ``timeout`` defaults to ``None`` (no timeout)
 
     Returns:
         Output from process_comm
@@ -98,8 +225,12 @@ def git_comm(cmd: typing.List[str], g_name: str = 'process', gitkwargs:
     '''
 
     # process kwargs
-    prockwargs = prockwargs or {}
+    prockwargs = dict(prockwargs or {})
     gitkwargs = gitkwargs or {}
+    fail_handle = prockwargs.pop('fail_handle', 'report')
+    timeout = prockwargs.pop('timeout', None)
+    # a credential prompt would wait forever: fail instead
+    prockwargs.setdefault('env', {**os.environ, 'GIT_TERMINAL_PROMPT': '0'})
 
     # Parse gitkwargs into arguments
     for key, val in gitkwargs.items():
@@ -107,8 +238,455 @@ def git_comm(cmd: typing.List[str], g_name: str = 'process', gitkwargs:
         cmd.append(key_flag)
         if val is not None:
             cmd.append(str(val))
-    return process_comm(*cmd, p_name=f'git {g_name}', timeout=None,
-                        fail_handle='report', **prockwargs)
+    return process_comm(*cmd, p_name=f'git {g_name}', timeout=timeout,
+                        fail_handle=fail_handle, **prockwargs)
+
+
+class GitBackend(abc.ABC):
+    '''
+    Interface to git repositories.
+
+    All methods accept:
+
+        * clone_dir: directory in which, project is (to be) cloned
+        * gitkwargs: parsed from to --key[=val] and passed to git command
+        * prockwargs: passed to ``process_comm``
+
+    and return ``None`` on failure.
+
+    '''
+    name = 'base'
+
+    @abc.abstractmethod
+    def clean(self, clone_dir: Path, gitkwargs:
+              typing.Dict[str, typing.Optional[str]] = None,
+              prockwargs: typing.Dict[str, typing.Any]
+              = None) -> typing.Optional[str]:
+        '''
+        Reset and clean git worktree
+        '''
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def remote_url(self, clone_dir: Path, gitkwargs:
+                   typing.Dict[str, typing.Optional[str]] = None,
+                   prockwargs: typing.Dict[str, typing.Any]
+                   = None) -> typing.Optional[str]:
+        '''
+        Fetch url of the (first) remote
+        '''
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def head(self, clone_dir: Path, gitkwargs:
+             typing.Dict[str, typing.Optional[str]] = None,
+             prockwargs: typing.Dict[str, typing.Any]
+             = None) -> typing.Optional[str]:
+        '''
+        Commit checked out at HEAD
+        '''
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def branch(self, clone_dir: Path, gitkwargs:
+               typing.Dict[str, typing.Optional[str]] = None,
+               prockwargs: typing.Dict[str, typing.Any]
+               = None) -> typing.Optional[str]:
+        '''
+        Checked out branch, ``None`` if HEAD is detached
+        '''
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def dirty(self, clone_dir: Path, gitkwargs:
+              typing.Dict[str, typing.Optional[str]] = None,
+              prockwargs: typing.Dict[str, typing.Any]
+              = None) -> typing.Optional[bool]:
+        '''
+        Does the worktree have changes or untracked files?
+        '''
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def pull(self, clone_dir: Path, gitkwargs:
+             typing.Dict[str, typing.Optional[str]] = None,
+             prockwargs: typing.Dict[str, typing.Any]
+             = None) -> typing.Optional[str]:
+        '''
+        Pull (without recursing submodules)
+        '''
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def pull_from(self, clone_dir: Path, source: str, gitkwargs:
+                  typing.Dict[str, typing.Optional[str]] = None,
+                  prockwargs: typing.Dict[str, typing.Any]
+                  = None) -> typing.Optional[str]:
+        '''
+        Fetch branches from ``source`` (bundle/local clone) in place of
+        origin and fast-forward to upstream
+        '''
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def submodule_update(self, clone_dir: Path, jobs: int = 1, gitkwargs:
+                         typing.Dict[str, typing.Optional[str]] = None,
+                         prockwargs: typing.Dict[str, typing.Any]
+                         = None) -> typing.Optional[str]:
+        '''
+        Initialize and update submodules (recursively) in parallel
+        '''
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def submodule_status(self, clone_dir: Path, gitkwargs:
+                         typing.Dict[str, typing.Optional[str]] = None,
+                         prockwargs: typing.Dict[str, typing.Any]
+                         = None) -> typing.Optional[str]:
+        '''
+        Commits checked out in submodules (recursively)
+        '''
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def clone(self, clone_dir: Path, url: str, name: str, gitkwargs:
+              typing.Dict[str, typing.Optional[str]] = None,
+              prockwargs: typing.Dict[str, typing.Any]
+              = None) -> typing.Optional[str]:
+        '''
+        Clone remote ``url`` as ``name``
+        '''
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def clone_from(self, clone_dir: Path, source: str, url: str, name: str,
+                   gitkwargs: typing.Dict[str, typing.Optional[str]] = None,
+                   prockwargs: typing.Dict[str, typing.Any]
+                   = None) -> typing.Optional[str]:
+        '''
+        Clone ``source`` (bundle/local clone) as ``name``
+        with ``url`` as its origin
+        '''
+        raise NotImplementedError
+
+
+class CliGit(GitBackend):
+    '''
+    Git backend that runs the git command (default)
+
+    '''
+    name = 'cli'
+
+    def clean(self, clone_dir: Path, gitkwargs:
+              typing.Dict[str, typing.Optional[str]] = None,
+              prockwargs: typing.Dict[str, typing.Any]
+              = None) -> typing.Optional[str]:
+        checkout = ['git', '-C', str(clone_dir), 'checkout', 'HEAD', '--',
+                    ':/']
+        clean = ['git', '-C', str(clone_dir), 'clean', '-f', '--', ':/']
+        if not bool(git_comm(checkout, g_name='checkout', gitkwargs=gitkwargs,
+                             prockwargs=prockwargs)):
+            return None
+        return git_comm(clean, g_name='clean', gitkwargs=gitkwargs,
+                        prockwargs=prockwargs)
+
+    def remote_url(self, clone_dir: Path, gitkwargs:
+                   typing.Dict[str, typing.Optional[str]] = None,
+                   prockwargs: typing.Dict[str, typing.Any]
+                   = None) -> typing.Optional[str]:
+        cmd: typing.List[str] = ['git', "-C", str(clone_dir), 'remote', "-v"]
+        remote = git_comm(cmd, g_name='list',
+                          gitkwargs=gitkwargs, prockwargs=prockwargs)
+        if remote is None:
+            # failed
+            return None
+        fetch: typing.List[str] = re.findall(r"^.*fetch.*", remote)
+        if not fetch:
+            # no remote
+            return None
+        url = fetch[0].split(' ')[-2].split("\t")[-1].rstrip('/')
+        return url
+
+    def head(self, clone_dir: Path, gitkwargs:
+             typing.Dict[str, typing.Optional[str]] = None,
+             prockwargs: typing.Dict[str, typing.Any]
+             = None) -> typing.Optional[str]:
+        cmd: typing.List[str] = ['git', '-C', str(clone_dir),
+                                 'rev-parse', 'HEAD']
+        head = git_comm(cmd, g_name='rev-parse',
+                        gitkwargs=gitkwargs, prockwargs=prockwargs)
+        if head is None:
+            return None
+        return head.strip()
+
+    def branch(self, clone_dir: Path, gitkwargs:
+               typing.Dict[str, typing.Optional[str]] = None,
+               prockwargs: typing.Dict[str, typing.Any]
+               = None) -> typing.Optional[str]:
+        cmd: typing.List[str] = ['git', '-C', str(clone_dir),
+                                 'symbolic-ref', '-q', '--short', 'HEAD']
+        branch = git_comm(cmd, g_name='symbolic-ref',
+                          gitkwargs=gitkwargs, prockwargs=prockwargs)
+        if branch is None:
+            return None
+        return branch.strip()
+
+    def dirty(self, clone_dir: Path, gitkwargs:
+              typing.Dict[str, typing.Optional[str]] = None,
+              prockwargs: typing.Dict[str, typing.Any]
+              = None) -> typing.Optional[bool]:
+        cmd: typing.List[str] = ['git', '-C', str(clone_dir),
+                                 'status', '--porcelain']
+        status = git_comm(cmd, g_name='status',
+                          gitkwargs=gitkwargs, prockwargs=prockwargs)
+        if status is None:
+            return None
+        # process_comm reports blank stdout as 'success'
+        return status != 'success' and bool(status.strip())
+
+    def pull(self, clone_dir: Path, gitkwargs:
+             typing.Dict[str, typing.Optional[str]] = None,
+             prockwargs: typing.Dict[str, typing.Any]
+             = None) -> typing.Optional[str]:
+        cmd: typing.List[str] = ['git', '-C', str(clone_dir),
+                                 'pull', '--no-recurse-submodules']
+        return git_comm(cmd, g_name='pull',
+                        gitkwargs=gitkwargs, prockwargs=prockwargs)
+
+    def pull_from(self, clone_dir: Path, source: str, gitkwargs:
+                  typing.Dict[str, typing.Optional[str]] = None,
+                  prockwargs: typing.Dict[str, typing.Any]
+                  = None) -> typing.Optional[str]:
+        fetch = ['git', '-C', str(clone_dir), 'fetch', source,
+                 '+refs/heads/*:refs/remotes/origin/*']
+        merge = ['git', '-C', str(clone_dir), 'merge', '--ff-only', '@{u}']
+        if git_comm(fetch, g_name='fetch', gitkwargs=gitkwargs,
+                    prockwargs=prockwargs) is None:
+            return None
+        return git_comm(merge, g_name='merge', prockwargs=prockwargs)
+
+    def submodule_update(self, clone_dir: Path, jobs: int = 1, gitkwargs:
+                         typing.Dict[str, typing.Optional[str]] = None,
+                         prockwargs: typing.Dict[str, typing.Any]
+                         = None) -> typing.Optional[str]:
+        cmd: typing.List[str] = ['git', '-C', str(clone_dir), 'submodule',
+                                 'update', '--init', '--recursive',
+                                 '--jobs', str(max(1, jobs))]
+        return git_comm(cmd, g_name='submodule',
+                        gitkwargs=gitkwargs, prockwargs=prockwargs)
+
+    def submodule_status(self, clone_dir: Path, gitkwargs:
+                         typing.Dict[str, typing.Optional[str]] = None,
+                         prockwargs: typing.Dict[str, typing.Any]
+                         = None) -> typing.Optional[str]:
+        cmd: typing.List[str] = ['git', '-C', str(clone_dir), 'submodule',
+                                 'status', '--recursive']
+        return git_comm(cmd, g_name='submodule',
+                        gitkwargs=gitkwargs, prockwargs=prockwargs)
+
+    def clone(self, clone_dir: Path, url: str, name: str, gitkwargs:
+              typing.Dict[str, typing.Optional[str]] = None,
+              prockwargs: typing.Dict[str, typing.Any]
+              = None) -> typing.Optional[str]:
+        cmd: typing.List[str] = ['git', '-C', str(clone_dir.parent),
+                                 'clone', url, name]
+        return git_comm(cmd, g_name='clone',
+                        gitkwargs=gitkwargs, prockwargs=prockwargs)
+
+    def clone_from(self, clone_dir: Path, source: str, url: str, name: str,
+                   gitkwargs: typing.Dict[str, typing.Optional[str]] = None,
+                   prockwargs: typing.Dict[str, typing.Any]
+                   = None) -> typing.Optional[str]:
+        cloned = self.clone(clone_dir, url=source, name=name,
+                            gitkwargs=gitkwargs, prockwargs=prockwargs)
+        if cloned is None:
+            return None
+        set_url = ['git', '-C', str(clone_dir), 'remote', 'set-url', 'origin',
+                   url]
+        if git_comm(set_url, g_name='remote', prockwargs=prockwargs) is None:
+            return None
+        return cloned
+
+
+class InProcGit(CliGit):
+    '''
+    Git backend that reads remote url, HEAD and branch
+    directly from the repository's files.
+    Worktree state is read using ``pygit2``, if it is installed.
+
+    Everything else, and queries that carry ``gitkwargs``,
+    are passed on to :class:`CliGit`.
+
+    Note:
+        ``url.<base>.insteadOf`` rewrites are not applied to remote urls
+
+    '''
+    name = 'inproc'
+
+    @staticmethod
+    def _git_dirs(clone_dir: Path) -> typing.Optional[
+            typing.Tuple[Path, Path]]:
+        '''
+        Locate git directory and common directory (differs for worktrees)
+
+        Returns:
+            git_dir, common_dir; ``None`` if not a repository
+        '''
+        git_dir = Path(clone_dir).joinpath('.git')
+        if git_dir.is_file():
+            # submodule or worktree: "gitdir: <path>"
+            with open(git_dir, 'r') as git_fh:
+                pointer = git_fh.read().strip()
+            if not pointer.startswith('gitdir:'):
+                return None
+            git_dir = git_dir.parent.joinpath(
+                pointer[len('gitdir:'):].strip()
+            ).resolve()
+        if not git_dir.is_dir():
+            return None
+        common_dir = git_dir
+        if git_dir.joinpath('commondir').is_file():
+            with open(git_dir.joinpath('commondir'), 'r') as common_fh:
+                common_dir = git_dir.joinpath(common_fh.read().strip())\
+                    .resolve()
+        return git_dir, common_dir
+
+    @staticmethod
+    def _resolve(ref: str, git_dir: Path,
+                 common_dir: Path) -> typing.Optional[str]:
+        '''
+        Resolve ``ref`` to a commit hash using loose and packed refs
+        '''
+        for ref_base in git_dir, common_dir:
+            ref_file = ref_base.joinpath(ref)
+            if ref_file.is_file():
+                with open(ref_file, 'r') as ref_fh:
+                    target = ref_fh.read().strip()
+                if target.startswith('ref:'):
+                    return InProcGit._resolve(target[4:].strip(), git_dir,
+                                              common_dir)
+                return target
+        packed = common_dir.joinpath('packed-refs')
+        if packed.is_file():
+            with open(packed, 'r') as packed_fh:
+                for line in packed_fh:
+                    line = line.strip()
+                    if not line or line[0] in '#^':
+                        continue
+                    commit, _, name = line.partition(' ')
+                    if name == ref:
+                        return commit
+        return None
+
+    def _head_ref(self, clone_dir: Path) -> typing.Optional[
+            typing.Tuple[str, Path, Path]]:
+        '''
+        Contents of HEAD and git directories
+        '''
+        dirs = self._git_dirs(clone_dir)
+        if dirs is None or not dirs[0].joinpath('HEAD').is_file():
+            return None
+        with open(dirs[0].joinpath('HEAD'), 'r') as head_fh:
+            return (head_fh.read().strip(), *dirs)
+
+    def remote_url(self, clone_dir: Path, gitkwargs:
+                   typing.Dict[str, typing.Optional[str]] = None,
+                   prockwargs: typing.Dict[str, typing.Any]
+                   = None) -> typing.Optional[str]:
+        if gitkwargs:
+            return super().remote_url(clone_dir, gitkwargs, prockwargs)
+        dirs = self._git_dirs(clone_dir)
+        if dirs is None or not dirs[1].joinpath('config').is_file():
+            return None
+        # like `git remote -v`: first remote in sorted order
+        remotes: typing.Dict[str, str] = {}
+        section: typing.Optional[str] = None
+        with open(dirs[1].joinpath('config'), 'r') as config_fh:
+            for line in config_fh:
+                header = re.match(r'^\s*\[\s*([^\s\]"]+)(?:\s+"(.*)")?\s*\]',
+                                  line)
+                if header is not None:
+                    section = header.group(2)\
+                        if header.group(1).lower() == 'remote' else None
+                    continue
+                if section is None:
+                    continue
+                value = re.match(r'^\s*url\s*=\s*(.*?)\s*$', line, re.I)
+                if value is not None:
+                    remotes.setdefault(section, value.group(1).strip('"'))
+        if not remotes:
+            return None
+        return remotes[sorted(remotes)[0]].rstrip('/')
+
+    def head(self, clone_dir: Path, gitkwargs:
+             typing.Dict[str, typing.Optional[str]] = None,
+             prockwargs: typing.Dict[str, typing.Any]
+             = None) -> typing.Optional[str]:
+        if gitkwargs:
+            return super().head(clone_dir, gitkwargs, prockwargs)
+        head_ref = self._head_ref(clone_dir)
+        if head_ref is None:
+            return None
+        head, git_dir, common_dir = head_ref
+        if head.startswith('ref:'):
+            return self._resolve(head[4:].strip(), git_dir, common_dir)
+        return head
+
+    def branch(self, clone_dir: Path, gitkwargs:
+               typing.Dict[str, typing.Optional[str]] = None,
+               prockwargs: typing.Dict[str, typing.Any]
+               = None) -> typing.Optional[str]:
+        if gitkwargs:
+            return super().branch(clone_dir, gitkwargs, prockwargs)
+        head_ref = self._head_ref(clone_dir)
+        if head_ref is None or not head_ref[0].startswith('ref:'):
+            return None
+        ref = head_ref[0][4:].strip()
+        if ref.startswith('refs/heads/'):
+            return ref[len('refs/heads/'):]
+        return ref
+
+    def dirty(self, clone_dir: Path, gitkwargs:
+              typing.Dict[str, typing.Optional[str]] = None,
+              prockwargs: typing.Dict[str, typing.Any]
+              = None) -> typing.Optional[bool]:
+        if gitkwargs or pygit2 is None:
+            return super().dirty(clone_dir, gitkwargs, prockwargs)
+        try:
+            status = pygit2.Repository(str(clone_dir)).status()
+        except (pygit2.GitError, KeyError):
+            return None
+        return any(flags != pygit2.GIT_STATUS_CURRENT
+                   and not flags & pygit2.GIT_STATUS_IGNORED
+                   for flags in status.values())
+
+
+GIT_BACKENDS: typing.Dict[str, typing.Type[GitBackend]] = {
+    'cli': CliGit,
+    'inproc': InProcGit,
+}
+'''
+Available git backends
+'''
+
+
+_BACKEND: GitBackend = CliGit()
+
+
+def set_git_backend(name: str = 'cli') -> GitBackend:
+    '''
+    Select the git backend used by this process (and its children)
+
+    Args:
+        name: key in ``GIT_BACKENDS``
+
+    Returns:
+        Selected backend
+
+    '''
+    global _BACKEND
+    _BACKEND = GIT_BACKENDS[name]()
+    return _BACKEND
 
 
 def git_clean(clone_dir: Path, gitkwargs:
@@ -125,13 +703,8 @@ def git_clean(clone_dir: Path, gitkwargs:
         Output from process_comm
 
     '''
-    checkout = ['git', '-C', str(clone_dir), 'checkout', 'HEAD', '--', ':/']
-    clean = ['git', '-C', str(clone_dir), 'clean', '-f', '--', ':/']
-    if not bool(git_comm(checkout, g_name='checkout', gitkwargs=gitkwargs,
-                         prockwargs=prockwargs)):
-        return None
-    return git_comm(clean, g_name='clean', gitkwargs=gitkwargs,
-                    prockwargs=prockwargs)
+    return _BACKEND.clean(clone_dir, gitkwargs=gitkwargs,
+                          prockwargs=prockwargs)
 
 
 def git_list(clone_dir: Path, gitkwargs: typing.Dict[str, typing.Optional[str]]
@@ -146,19 +719,70 @@ def git_list(clone_dir: Path, gitkwargs: typing.Dict[str, typing.Optional[str]]
         prockwargs: passed to ``process_comm``
 
     Returns:
-        Output from process_comm
+        Remote url
 
     '''
-    # Default $0 command
-    cmd: typing.List[str] = ['git', "-C", str(clone_dir), 'remote', "-v"]
-    remote = git_comm(cmd, g_name='list',
-                    gitkwargs=gitkwargs, prockwargs=prockwargs)
-    if remote is None:
-        # failed
-        return None
-    fetch: typing.List[str] = re.findall(r"^.*fetch.*", remote)
-    url = fetch[0].split(' ')[-2].split("\t")[-1].rstrip('/')
-    return url
+    return _BACKEND.remote_url(clone_dir, gitkwargs=gitkwargs,
+                               prockwargs=prockwargs)
+
+
+def git_head(clone_dir: Path, gitkwargs: typing.Dict[str, typing.Optional[str]]
+             = None, prockwargs: typing.Dict[str, typing.Any]
+             = None) -> typing.Optional[str]:
+    '''
+    Commit checked out at HEAD
+
+    Args:
+        clone_dir: directory in which, project is cloned
+        gitkwargs: parsed from to --key[=val] and passed to git command
+        prockwargs: passed to ``process_comm``
+
+    Returns:
+        Commit hash, ``None`` if it couldn't be determined
+
+    '''
+    return _BACKEND.head(clone_dir, gitkwargs=gitkwargs, prockwargs=prockwargs)
+
+
+def git_branch(clone_dir: Path, gitkwargs:
+               typing.Dict[str, typing.Optional[str]] = None,
+               prockwargs: typing.Dict[str, typing.Any]
+               = None) -> typing.Optional[str]:
+    '''
+    Checked out branch
+
+    Args:
+        clone_dir: directory in which, project is cloned
+        gitkwargs: parsed from to --key[=val] and passed to git command
+        prockwargs: passed to ``process_comm``
+
+    Returns:
+        Branch name, ``None`` if HEAD is detached
+
+    '''
+    return _BACKEND.branch(clone_dir, gitkwargs=gitkwargs,
+                           prockwargs=prockwargs)
+
+
+def git_dirty(clone_dir: Path, gitkwargs:
+              typing.Dict[str, typing.Optional[str]] = None,
+              prockwargs: typing.Dict[str, typing.Any]
+              = None) -> typing.Optional[bool]:
+    '''
+    Does the worktree carry changes or untracked files?
+
+    Args:
+        clone_dir: directory in which, project is cloned
+        gitkwargs: parsed from to --key[=val] and passed to git command
+        prockwargs: passed to ``process_comm``
+
+    Returns:
+        ``None`` if it couldn't be determined
+
+    '''
+    return _BACKEND.dirty(clone_dir, gitkwargs=gitkwargs,
+                          prockwargs=prockwargs)
+
 
 def git_pull(clone_dir: Path, gitkwargs: typing.Dict[str, typing.Optional[str]]
              = None, prockwargs: typing.Dict[str, typing.Any]
@@ -166,6 +790,9 @@ def git_pull(clone_dir: Path, gitkwargs: typing.Dict[str, typing.Optional[str]]
     '''
     Perform a git action
 
+    Submodules are not recursed here,
+    they are updated by :meth:`git_submodule_update`, only if required.
+
     Args:
         clone_dir: directory in which, project is (to be) cloned
         gitkwargs: parsed from to --key[=val] and passed to git command
@@ -175,11 +802,70 @@ def git_pull(clone_dir: Path, gitkwargs: typing.Dict[str, typing.Optional[str]]
         Output from process_comm
 
     '''
-    # Default $0 command
-    cmd: typing.List[str] = ['git', '-C', str(clone_dir),
-                             'pull', '--recurse-submodules']
-    return git_comm(cmd, g_name='pull',
-                    gitkwargs=gitkwargs, prockwargs=prockwargs)
+    return _BACKEND.pull(clone_dir, gitkwargs=gitkwargs, prockwargs=prockwargs)
+
+
+def git_pull_from(clone_dir: Path, source: str, gitkwargs:
+                  typing.Dict[str, typing.Optional[str]] = None,
+                  prockwargs: typing.Dict[str, typing.Any]
+                  = None) -> typing.Optional[str]:
+    '''
+    Update from a local source (git bundle or clone) in place of origin
+
+    Args:
+        clone_dir: directory in which, project is cloned
+        source: path to git bundle or local clone
+        gitkwargs: parsed from to --key[=val] and passed to git fetch
+        prockwargs: passed to ``process_comm``
+
+    Returns:
+        Output from process_comm (of fast-forward merge)
+
+    '''
+    return _BACKEND.pull_from(clone_dir, source=source, gitkwargs=gitkwargs,
+                              prockwargs=prockwargs)
+
+
+def git_submodule_update(clone_dir: Path, jobs: int = 1, gitkwargs:
+                         typing.Dict[str, typing.Optional[str]] = None,
+                         prockwargs: typing.Dict[str, typing.Any]
+                         = None) -> typing.Optional[str]:
+    '''
+    Initialize and update submodules (recursively) in parallel
+
+    Args:
+        clone_dir: directory in which, project is cloned
+        jobs: number of submodules fetched in parallel
+        gitkwargs: parsed from to --key[=val] and passed to git command
+        prockwargs: passed to ``process_comm``
+
+    Returns:
+        Output from process_comm
+
+    '''
+    return _BACKEND.submodule_update(clone_dir, jobs=jobs, gitkwargs=gitkwargs,
+                                     prockwargs=prockwargs)
+
+
+def git_submodule_status(clone_dir: Path, gitkwargs:
+                         typing.Dict[str, typing.Optional[str]] = None,
+                         prockwargs: typing.Dict[str, typing.Any]
+                         = None) -> typing.Optional[str]:
+    '''
+    Commits checked out in submodules (recursively)
+
+    Args:
+        clone_dir: directory in which, project is cloned
+        gitkwargs: parsed from to --key[=val] and passed to git command
+        prockwargs: passed to ``process_comm``
+
+    Returns:
+        Output from process_comm
+
+    '''
+    return _BACKEND.submodule_status(clone_dir, gitkwargs=gitkwargs,
+                                     prockwargs=prockwargs)
+
 
 def git_clone(clone_dir: Path, url: str, name: str, gitkwargs:
               typing.Dict[str, typing.Optional[str]] = None, prockwargs:
@@ -198,8 +884,29 @@ def git_clone(clone_dir: Path, url: str, name: str, gitkwargs:
         Output from process_comm
 
     '''
-    # Default $0 command
-    cmd: typing.List[str] = ['git', '-C', str(clone_dir.parent),
-                             'clone', url, name]
-    return git_comm(cmd, g_name='clone',
-                    gitkwargs=gitkwargs, prockwargs=prockwargs)
+    return _BACKEND.clone(clone_dir, url=url, name=name, gitkwargs=gitkwargs,
+                          prockwargs=prockwargs)
+
+
+def git_clone_from(clone_dir: Path, source: str, url: str, name: str,
+                   gitkwargs: typing.Dict[str, typing.Optional[str]] = None,
+                   prockwargs: typing.Dict[str, typing.Any]
+                   = None) -> typing.Optional[str]:
+    '''
+    Clone from a local source (git bundle or clone),
+    later updates are pulled from ``url``
+
+    Args:
+        clone_dir: directory in which, project is (to be) cloned
+        source: path to git bundle or local clone
+        url: remote url to set as origin
+        name: name (path) of project
+        gitkwargs: parsed from to --key[=val] and passed to git clone
+        prockwargs: passed to ``process_comm``
+
+    Returns:
+        Output from process_comm
+
+    '''
+    return _BACKEND.clone_from(clone_dir, source=source, url=url, name=name,
+                               gitkwargs=gitkwargs, prockwargs=prockwargs)
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8; mode:python -*-
+#
+# Copyright 2020 Pradyumna Paranjape
+# This file is part of pspman.
+#
+# pspman is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pspman is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with pspman.  If not, see <https://www.gnu.org/licenses/>.
+#
+'''
+Staged installations
+
+Projects are installed in a private staging root (``DESTDIR``, ``__root__``)
+and merged into the prefix, one project at a time, by :func:`merge`.
+A staged file that another project's manifest already lists is a conflict:
+nothing of the project is merged.
+
+'''
+
+
+import os
+import fcntl
+import shutil
+import typing
+import tempfile
+import contextlib
+from pathlib import Path
+from . import print
+from .artifacts import occupy
+from .define import project_locks
+from .manifests import project_manifests, read_manifest, record_install
+
+
+@contextlib.contextmanager
+def staging(prefix: Path, name: str) -> typing.Iterator[Path]:
+    '''
+    Private staging root, removed after use
+
+    Args:
+        prefix: installation prefix
+        name: name of project
+
+    Yields:
+        Path to staging root
+    '''
+    stage_base = prefix.joinpath('temp_build', 'stage')
+    stage_base.mkdir(parents=True, exist_ok=True)
+    stage = Path(tempfile.mkdtemp(prefix=f'{name}.', dir=stage_base))
+    try:
+        yield stage
+    finally:
+        shutil.rmtree(stage, ignore_errors=True)
+
+
+def stage_env(stage: typing.Optional[Path]) -> typing.Dict[str, str]:
+    '''
+    Environment variables that direct installations to the staging root.
+    pip is directed by the ``__root__`` argument instead:
+    ``PIP_ROOT`` would also reach the pip calls of its isolated builds.
+
+    Args:
+        stage: staging root
+
+    Returns:
+        Modifications in shell env variables, empty if not staged
+    '''
+    if stage is None:
+        return {}
+    return {'DESTDIR': str(stage)}
+
+
+def _staged_files(root: Path) -> typing.List[str]:
+    '''
+    Files and links staged under root, relative to root
+    '''
+    staged: typing.List[str] = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        rel_dir = os.path.relpath(dirpath, root)
+        for entry in filenames + [name for name in dirnames
+                                  if os.path.islink(os.path.join(dirpath,
+                                                                 name))]:
+            staged.append(os.path.normpath(os.path.join(rel_dir, entry)))
+    return sorted(staged)
+
+
+def merge(stage: Path, prefix: Path, clone_dir: Path, name: str,
+          source: Path = None, extra: typing.Iterable[str] = ()
+          ) -> typing.Optional[typing.List[str]]:
+    '''
+    Move staged files into prefix and record the manifest of project.
+    Merges (of all pspman processes) are serialized by a lock of the group.
+
+    Args:
+        stage: staging root
+        prefix: installation prefix
+        clone_dir: directory in which, project is cloned
+        name: name of project
+        source: path to project's source code, ``None``: not a project
+        extra: files that the project put in prefix directly
+
+    Returns:
+        Merged relative paths, ``None`` if conflicts prevented the merge
+    '''
+    rel_root = str(prefix).lstrip(os.sep)
+    root = stage.joinpath(rel_root)
+    staged = _staged_files(root) if root.is_dir() else []
+    for stray in _staged_files(stage):
+        if not stray.startswith(rel_root + os.sep):
+            print(f'{name} installs outside prefix, skipped: /{stray}',
+                  mark='warn')
+    # not in prefix: captures would take the lock for an installed file
+    locks = project_locks(clone_dir)
+    locks.mkdir(parents=True, exist_ok=True)
+    lock_fd = os.open(locks.joinpath('.merge'), os.O_RDWR | os.O_CREAT,
+                      0o600)
+    try:
+        fcntl.flock(lock_fd, fcntl.LOCK_EX)
+        owners: typing.Dict[str, str] = {}
+        for other in project_manifests(clone_dir):
+            if other != name:
+                for path in read_manifest(clone_dir, other) or []:
+                    owners[path] = other
+        conflicts: typing.Dict[str, str] = {}
+        for path in staged:
+            dest = prefix.joinpath(path)
+            if dest.is_dir() and not dest.is_symlink():
+                conflicts[path] = 'is a directory'
+            elif path in owners and os.path.lexists(dest):
+                conflicts[path] = f'belongs to {owners[path]}'
+        if conflicts:
+            for path, reason in conflicts.items():
+                print(f'{name}: {path} {reason}', mark='err')
+            return None
+        with occupy(prefix, staged):
+            for path in staged:
+                dest = prefix.joinpath(path)
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(root.joinpath(path), dest)
+        record_install(clone_dir, name, prefix, list(extra) + staged, source)
+    finally:
+        os.close(lock_fd)
+    return staged
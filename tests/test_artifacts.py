@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8; mode:python -*-
+#
+# Copyright 2020 Pradyumna Paranjape
+# This file is part of pspman.
+#
+# pspman is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pspman is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with pspman.  If not, see <https://www.gnu.org/licenses/>.
+#
+'''
+Captures of installed files in a prefix
+
+'''
+
+
+import time
+import importlib
+import pytest
+
+
+@pytest.fixture
+def artifacts(tmp_path, monkeypatch):
+    '''
+    pspman.artifacts, configured in a temporary home
+    '''
+    monkeypatch.setenv('HOME', str(tmp_path.joinpath('home')))
+    monkeypatch.setenv('XDG_CONFIG_HOME', str(tmp_path.joinpath('config')))
+    monkeypatch.setenv('XDG_DATA_HOME', str(tmp_path.joinpath('data')))
+    return importlib.import_module('pspman.artifacts')
+
+
+@pytest.fixture
+def prefix(tmp_path):
+    '''
+    Empty installation prefix
+    '''
+    prefix = tmp_path.joinpath('prefix')
+    prefix.mkdir()
+    return prefix
+
+
+def _settle(artifacts):
+    '''
+    Let file times move past the clock slack of captures
+    '''
+    time.sleep(2 * artifacts.CLOCK_SLACK_NS / 1e9)
+
+
+def test_overlapping_captures_disjoint_files(artifacts, prefix, tmp_path):
+    '''
+    Overlapping captures that wrote different files outside their overlap
+    '''
+    first_ctx = artifacts.capture(prefix)
+    first = first_ctx.__enter__()
+    prefix.joinpath('first').write_text('first')
+    _settle(artifacts)
+    second_ctx = artifacts.capture(prefix)
+    second = second_ctx.__enter__()
+    first_ctx.__exit__(None, None, None)
+    prefix.joinpath('second').write_text('second')
+    second_ctx.__exit__(None, None, None)
+    assert (first.files, first.shared) == (['first'], [])
+    assert (second.files, second.shared) == (['second'], [])
+    cache = tmp_path.joinpath('cache')
+    assert artifacts.store('first', prefix, first.files, cache=cache)
+    assert artifacts.store('second', prefix, second.files, cache=cache)
+
+
+def test_overlapping_captures_shared_files(artifacts, prefix):
+    '''
+    A file written while both captures were open belongs to neither
+    '''
+    with artifacts.capture(prefix) as first:
+        prefix.joinpath('first').write_text('first')
+        _settle(artifacts)
+        with artifacts.capture(prefix) as second:
+            prefix.joinpath('either').write_text('either')
+    assert (first.files, first.shared) == (['first'], ['either'])
+    assert (second.files, second.shared) == ([], ['either'])
+
+
+def test_declared_writes_are_not_captured(artifacts, prefix):
+    '''
+    Files declared by a writer are not attributed to an open capture
+    '''
+    with artifacts.capture(prefix) as captured:
+        prefix.joinpath('own').write_text('own')
+        with artifacts.occupy(prefix, ['merged']):
+            prefix.joinpath('merged').write_text('merged')
+    assert (captured.files, captured.shared) == (['own'], [])
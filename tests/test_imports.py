@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8; mode:python -*-
+#
+# Copyright 2020 Pradyumna Paranjape
+# This file is part of pspman.
+#
+# pspman is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pspman is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with pspman.  If not, see <https://www.gnu.org/licenses/>.
+#
+'''
+Imports of the command line, that every call pays for
+
+'''
+
+
+import sys
+import subprocess
+
+
+def test_define_defers_heavy_imports():
+    '''
+    Parsing the command line doesn't import yaml, psprint or argcomplete
+    '''
+    report = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import pspman.define'],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True, check=True
+    ).stderr
+    imported = {line.rpartition('|')[2].strip().split('.')[0]
+                for line in report.splitlines()
+                if line.startswith('import time:')}
+    assert 'pspman' in imported
+    assert not imported & {'yaml', 'psprint', 'argcomplete'}